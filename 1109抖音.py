@@ -1,12 +1,18 @@
 import sys
 import io
 import json
+import hashlib
 import asyncio
 import os
 import re
+import sqlite3
+import tempfile
 import requests
 import time
+import uuid
+import threading
 import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import ffmpeg
 from dotenv import load_dotenv
@@ -15,6 +21,14 @@ import subprocess
 from typing import Dict, Any, Optional, List
 from urllib.parse import urlparse, parse_qs
 
+from feishu_bitable import BitableClient
+from ranged_download import discard_partial, download_file, iter_ranged, remove_stale_parts
+
+try:
+    import httpx
+except ImportError:  # 未安装 httpx 时，转写阶段退回到线程中调用 requests
+    httpx = None
+
 # URL提取函数
 def extract_douyin_url(input_text):
     douyin_pattern = r'https?://v\.douyin\.com/[A-Za-z0-9]+'
@@ -53,6 +67,31 @@ DOWNLOAD_DIR = "douyin_downloads"
 # 更新 User-Agent 以匹配最新请求 (Chrome 141)
 BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0'
 BASE_URL = "https://www.douyin.com"
+# batch 模式下同时处理的主页数量，可用 --concurrency 覆盖
+HOMEPAGE_CONCURRENCY = int(os.getenv("HOMEPAGE_CONCURRENCY", "4"))
+# 飞书输出表中已有视频链接的本地缓存，有效期内不再整表读取；写入成功的链接会立即追加到缓存
+VIDEO_LINK_CACHE_FILE = os.getenv("VIDEO_LINK_CACHE_FILE", "video_links_cache.json")
+VIDEO_LINK_CACHE_TTL_HOURS = float(os.getenv("VIDEO_LINK_CACHE_TTL_HOURS", "72"))
+# 已下载视频的 aweme_id → 内容哈希 索引，跨运行保留，用于识别不同 aweme_id 下的相同视频
+VIDEO_CONTENT_INDEX_FILE = os.getenv("VIDEO_CONTENT_INDEX_FILE", "video_content_index.json")
+# 视频处理流水线各阶段的并发度：下载用 IO 线程，ffmpeg 用进程池 (默认等于 CPU 核数)，转写为同时在途的 API 请求数
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "4"))
+PIPELINE_EXTRACT_WORKERS = int(os.getenv("PIPELINE_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+PIPELINE_TRANSCRIBE_CONCURRENCY = int(os.getenv("PIPELINE_TRANSCRIBE_CONCURRENCY", "4"))
+# 阶段之间队列的容量，下游变慢时上游会在此处等待，而不是把所有视频先下载到磁盘
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+# 转写结果的本地缓存 (SQLite)，按 aweme_id + 音频内容哈希 命中，总大小超过上限时淘汰最久未使用的记录
+TRANSCRIPT_CACHE_FILE = os.getenv("TRANSCRIPT_CACHE_FILE", "transcripts_cache.sqlite3")
+TRANSCRIPT_CACHE_MAX_MB = float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "50"))
+# 提取音频的编码配置：asr 为 16 kHz 单声道低码率 MP3 (语音识别足够，上传体积约为 standard 的 1/4)，standard 为原来的 128k 立体声
+AUDIO_PROFILE = os.getenv("AUDIO_PROFILE", "asr")
+ASR_AUDIO_SAMPLE_RATE = int(os.getenv("ASR_AUDIO_SAMPLE_RATE", "16000"))
+ASR_AUDIO_BITRATE = os.getenv("ASR_AUDIO_BITRATE", "32k")
+# 设为 1 时去掉 asr 音频开头和结尾的静音
+ASR_TRIM_SILENCE = os.getenv("ASR_TRIM_SILENCE", "0") == "1"
+STANDARD_AUDIO_BITRATE = "128k"
+SILICONFLOW_TRANSCRIBE_URL = "https://api.siliconflow.cn/v1/audio/transcriptions"
+SILICONFLOW_ASR_MODEL = "FunAudioLLM/SenseVoiceSmall"
 
 # ==============================================================================
 # --- API 硬编码配置 (已更新 Cookie) ---
@@ -150,161 +189,664 @@ def check_dependencies(log_list_ref):
         return False, error_msg
 
 # --- 模块一：飞书数据仓库管理员 ---
-class FeishuAPI:
-    def __init__(self, app_id, app_secret):
-        self.app_id = app_id
-        self.app_secret = app_secret
-        self.access_token = None
-        self.token_expires_at = 0
-
-    def _get_tenant_access_token(self):
-        if self.access_token and time.time() < self.token_expires_at:
-            return self.access_token
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-        payload = {"app_id": self.app_id, "app_secret": self.app_secret}
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("code") == 0:
-            self.access_token = data["tenant_access_token"]
-            self.token_expires_at = time.time() + data.get("expire", 7200) - 300
-            return self.access_token
-        else:
-            raise Exception(f"获取飞书Token失败: {data.get('msg')}")
+def link_field_value(field) -> Optional[str]:
+    """飞书链接字段的标准格式是 [{"link": "URL"}]，也兼容纯文本 URL。"""
+    if isinstance(field, list) and len(field) > 0:
+        link_obj = field[0]
+        if isinstance(link_obj, dict) and "link" in link_obj:
+            return link_obj["link"]
+    elif isinstance(field, dict) and "link" in field:
+        return field["link"]
+    elif isinstance(field, str) and field.startswith("http"):
+        return field
+    return None
 
-    def get_first_table_id(self, app_token):
-        token = self._get_tenant_access_token()
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables"
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(url, headers=headers, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("code") == 0 and data["data"]["items"]:
-            return data["data"]["items"][0]["table_id"]
-        else:
-            raise Exception(f"获取飞书数据表ID失败: {data.get('msg')}")
+class FeishuAPI(BitableClient):
+    """在共享的 BitableClient (Token 缓存、连接池、预取分页、请求统计) 之上提供本脚本用到的读写方法。"""
 
     # 【新增函数】获取指定表格中所有“视频链接”
     def get_all_video_links(self, app_token: str, table_id: str) -> set:
         """
-        从飞书表格中获取所有“视频链接”列的值，并返回一个集合以便快速去重。
+        从飞书表格中获取所有“视频链接”列的值，并返回一个集合以便快速去重。读取失败时抛出异常，不返回不完整的结果。
         """
         all_links = set()
-        token = self._get_tenant_access_token()
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records"
-        headers = {"Authorization": f"Bearer {token}"}
-        
-        page_token = ""
-        while True:
-            params = {"page_size": 500, "field_names": '["视频链接"]'} # 只请求需要的列
-            if page_token:
-                params["page_token"] = page_token
-            
-            try:
-                response = requests.get(url, headers=headers, params=params, timeout=60)
-                response.raise_for_status()
-                result = response.json()
-
-                if result.get("code") != 0:
-                    print(f"获取飞书记录时出错: {result.get('msg')}")
-                    break
-                
-                data = result.get("data", {})
-                items = data.get("items", [])
-                for item in items:
-                    fields = item.get("fields", {})
-                    video_link_field = fields.get("视频链接")
-                    # 飞书链接字段的标准格式是 [{"link": "URL"}]
-                    if isinstance(video_link_field, list) and len(video_link_field) > 0:
-                        link_obj = video_link_field[0]
-                        if isinstance(link_obj, dict) and "link" in link_obj:
-                            all_links.add(link_obj["link"])
-                    # 也兼容可能是纯文本URL的情况
-                    elif isinstance(video_link_field, str) and video_link_field.startswith("http"):
-                        all_links.add(video_link_field)
-
-                if data.get("has_more"):
-                    page_token = data.get("page_token")
-                else:
-                    break
-            except Exception as e:
-                print(f"请求飞书记录时发生异常: {e}")
-                break # 发生异常时中断，避免无限循环
-        
+        for item in self.iter_records(app_token, table_id, field_names=["视频链接"]): # 只请求需要的列
+            link = link_field_value(item.fields.get("视频链接"))
+            if link: all_links.add(link)
         return all_links
 
     def add_records_batch(self, app_token, table_id, records):
-        token = self._get_tenant_access_token()
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_create"
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json; charset=utf-8"}
-        payload = {"records": records}
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
-        response.raise_for_status()
-        result = response.json()
-        if result.get("code") != 0:
-            print(f"飞书API错误详情: {result}")
-            raise Exception(f"批量写入飞书记录失败: {result.get('msg')}")
-        return result
+        """records 为 [{"fields": {...}}] 形式，超过 500 条时自动分批写入。"""
+        for response in self.create_records(app_token, table_id, [record["fields"] for record in records]):
+            if not response.success():
+                print(f"飞书API错误详情: code={response.code}, msg={response.msg}, log_id={response.get_log_id()}")
+                raise Exception(f"批量写入飞书记录失败: {response.msg}")
+        return True
+
+class VideoLinkIndex:
+    """整个运行共享的视频链接去重索引。
+
+    首次使用时加载一次 (缓存文件在有效期内且属于同一张表时直接读取，否则整表读取飞书)，之后各主页只查内存。
+    claim() 会把新链接标记为处理中，避免并发的主页重复处理同一个视频；写入飞书成功后 commit() 将其加入索引并更新缓存，
+    失败时 release() 释放，留给下次运行。
+    """
+    def __init__(self, feishu_api, app_token, table_id, cache_file=VIDEO_LINK_CACHE_FILE, ttl_hours=VIDEO_LINK_CACHE_TTL_HOURS):
+        self.feishu_api = feishu_api
+        self.app_token = app_token
+        self.table_id = table_id
+        self.cache_file = cache_file
+        self.ttl_hours = ttl_hours
+        self.links = set()
+        self.in_flight = set()
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, log_list=None):
+        """加载索引，只在第一次调用时真正读取。读取飞书失败时抛出异常，下次调用会重试。"""
+        with self._lock:
+            if self.loaded: return len(self.links)
+            cached = self._read_cache()
+            if cached is not None:
+                self.links = cached
+                log_message(log_list, f"✅ 从本地缓存加载了 {len(self.links)} 个现有链接。")
+            else:
+                self.links = self.feishu_api.get_all_video_links(self.app_token, self.table_id)
+                log_message(log_list, f"✅ 已从飞书获取 {len(self.links)} 个现有链接。")
+                self.loaded = True
+                self._write_cache(refresh=True)
+            self.loaded = True
+            return len(self.links)
+
+    def claim(self, links):
+        """返回尚未记录、也没有其他主页正在处理的链接，并把它们标记为处理中。"""
+        with self._lock:
+            new_links = [link for link in links if link not in self.links and link not in self.in_flight]
+            self.in_flight.update(new_links)
+            return new_links
+
+    def commit(self, links):
+        """把已写入飞书的链接加入索引。索引没有加载成功时只更新内存：此时 self.links 不是整表内容，
+        写进缓存会让下次运行把它当成完整列表，从而重复处理表里已有的视频。"""
+        with self._lock:
+            self.in_flight.difference_update(links)
+            if not links: return
+            self.links.update(links)
+            if self.loaded: self._write_cache()
+
+    def release(self, links):
+        with self._lock:
+            self.in_flight.difference_update(links)
+
+    def _read_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file): return None
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f: cache = json.load(f)
+        except Exception:
+            return None
+        if cache.get("app_token") != self.app_token or cache.get("table_id") != self.table_id: return None
+        if time.time() - cache.get("loaded_at", 0) > self.ttl_hours * 3600: return None
+        return set(cache.get("links", []))
+
+    def _write_cache(self, refresh=False):
+        if not self.cache_file or not self.loaded: return
+        # loaded_at 记录的是最近一次整表读取的时间，增量追加不会延长缓存有效期
+        if not refresh and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f: loaded_at = json.load(f).get("loaded_at", time.time())
+            except Exception:
+                loaded_at = time.time()
+        else:
+            loaded_at = time.time()
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"app_token": self.app_token, "table_id": self.table_id, "loaded_at": loaded_at,
+                       "links": sorted(self.links)}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_file)
 
 # --- 模块二：视频下载器 ---
-def download_video(video_url, title, downloaded_sizes):
+def safe_file_stem(title):
+    # 更严格地清理标题作为文件名，移除所有Windows非法字符和空白符
+    safe_title = re.sub(r'[\\/*?:"<>|\r\n\t]', "", title or "").strip()
+    if len(safe_title) > 60:
+        safe_title = safe_title[:60]
+    return safe_title
+
+def media_file_stem(aweme_id, title):
+    """视频和音频文件名以 aweme_id 开头，标题只作为便于查找的后缀。
+
+    不同视频的标题可能相同 (博主重复使用文案，或标题为空)，只用标题命名时两个视频会共用同一个文件，
+    转写结果也会写到另一个视频下。aweme_id 含文件名不允许的字符时 (没有 aweme_id 时用的是视频链接) 改用其哈希。
+    """
+    key = str(aweme_id)
+    if not re.fullmatch(r"[0-9A-Za-z_-]{1,40}", key):
+        key = hashlib.sha1(key.encode()).hexdigest()[:16]
+    safe_title = safe_file_stem(title)
+    return f"{key}_{safe_title}" if safe_title else key
+
+class VideoContentIndex:
+    """按 aweme_id 和视频内容哈希去重的持久化索引，替代原来按文件大小判断重复 (不同视频大小相同时会误判)。
+
+    - 下载前: duplicate_of(aweme_id) — 该 aweme_id 以前被识别为另一个视频的重复内容时直接跳过，不再下载；
+    - 下载中: 调用方边接收数据边计算 sha256；
+    - 下载后: register(aweme_id, content_hash) — 相同内容已属于另一个 aweme_id 时返回那个 aweme_id，否则返回 None。
+    索引在每次新增记录后写回文件，可在多个下载线程间共享。
+    """
+    def __init__(self, path=VIDEO_CONTENT_INDEX_FILE):
+        self.path = path
+        self.by_aweme = {}
+        self.by_hash = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def duplicate_of(self, aweme_id) -> Optional[str]:
+        with self._lock:
+            owner = self.by_hash.get(self.by_aweme.get(aweme_id))
+            return owner if owner and owner != aweme_id else None
+
+    def register(self, aweme_id, content_hash) -> Optional[str]:
+        with self._lock:
+            owner = self.by_hash.setdefault(content_hash, aweme_id)
+            if self.by_aweme.get(aweme_id) != content_hash:
+                self.by_aweme[aweme_id] = content_hash
+                self._save()
+            return owner if owner != aweme_id else None
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: self.by_aweme = json.load(f).get("aweme_ids", {})
+        except Exception as e:
+            print(f"读取视频内容索引失败，将重新建立: {e}")
+            self.by_aweme = {}
+        # 同一内容以最先记录的 aweme_id 为准 (文件中按记录顺序保存)
+        for aweme_id, content_hash in self.by_aweme.items():
+            self.by_hash.setdefault(content_hash, aweme_id)
+
+    def _save(self):
+        if not self.path: return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"aweme_ids": self.by_aweme}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+def download_video(video_url, title, aweme_id, content_index):
     try:
-        # 更严格地清理标题作为文件名，移除所有Windows非法字符和空白符
-        safe_title = re.sub(r'[\\/*?:"<>|\r\n\t]', "", title).strip()
-        if len(safe_title) > 60:
-            safe_title = safe_title[:60]
-        if not safe_title:
-            safe_title = f"video_{int(time.time())}"
-        final_file_path = os.path.join(DOWNLOAD_DIR, f"{safe_title}.mp4")
+        duplicate_of = content_index.duplicate_of(aweme_id)
+        if duplicate_of:
+            return f"Duplicate_Content: 与 {duplicate_of} 内容相同", None
+        final_file_path = os.path.join(DOWNLOAD_DIR, f"{media_file_stem(aweme_id, title)}.mp4")
+        # 文件名以 aweme_id 开头，已存在说明是之前完整下载的同一个视频
         if os.path.exists(final_file_path):
-            return "Skipped_Title_Exists", final_file_path
+            return "Skipped_Video_Exists", final_file_path
         headers = {'User-Agent': BROWSER_USER_AGENT, 'Referer': 'https://www.douyin.com/'}
-        temp_file_path = os.path.join(DOWNLOAD_DIR, f"temp_{int(time.time())}.mp4")
-        with requests.get(video_url, headers=headers, stream=True, timeout=180) as r:
-            r.raise_for_status()
-            with open(temp_file_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        file_size = os.path.getsize(temp_file_path)
-        if file_size in downloaded_sizes:
+        # 临时文件名由 aweme_id 决定：网络中断时未完成的 .part 文件会保留，下次从断点继续 (服务器上的文件变化时会重新下载)；
+        # 一直没有完成的 .part 文件在启动时按 DOWNLOAD_PART_TTL_HOURS 清理
+        temp_file_path = os.path.join(DOWNLOAD_DIR, f"temp_{hashlib.sha1(str(aweme_id).encode()).hexdigest()[:16]}.mp4")
+        _, content_hash = download_file(video_url, temp_file_path, headers, hash_name="sha256")
+        duplicate_of = content_index.register(aweme_id, content_hash)
+        if duplicate_of:
             os.remove(temp_file_path)
-            return "Duplicate_Size", None
+            return f"Duplicate_Content: 与 {duplicate_of} 内容相同", None
         os.rename(temp_file_path, final_file_path)
-        downloaded_sizes.add(file_size)
         return "Success", final_file_path
     except requests.exceptions.RequestException as e:
         if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
             os.remove(temp_file_path)
         return f"Download_Request_Error: {e}", None
     except Exception as e:
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        if 'temp_file_path' in locals():
+            if os.path.exists(temp_file_path): os.remove(temp_file_path)
+            # 本地写入出错时部分数据也不可靠，不再续传
+            discard_partial(temp_file_path)
         return f"Download_IO_Error: {e}", None
 
+# 先去掉开头的静音，反转后再去掉原来结尾的静音，最后反转回来
+_TRIM_SILENCE_FILTER = ("silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.2,areverse,"
+                        "silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.2,areverse")
+
+def audio_output_args(profile=None):
+    profile = profile or AUDIO_PROFILE
+    if profile == "standard":
+        return {"acodec": "libmp3lame", "audio_bitrate": STANDARD_AUDIO_BITRATE}
+    args = {"acodec": "libmp3lame", "audio_bitrate": ASR_AUDIO_BITRATE, "ac": 1, "ar": ASR_AUDIO_SAMPLE_RATE}
+    if ASR_TRIM_SILENCE: args["af"] = _TRIM_SILENCE_FILTER
+    return args
+
+def _audio_only_command(input_target, output_path, input_args=None):
+    """生成只输出音轨的 ffmpeg 命令 (-vn 跳过视频流的解码)，编码参数取自 AUDIO_PROFILE。"""
+    stream = ffmpeg.input(input_target, **(input_args or {}))
+    stream = stream.output(output_path, vn=None, **audio_output_args())
+    # -xerror: 输入解析出错时以非零状态退出，否则 ffmpeg 会输出空文件并返回 0
+    # -benchmark: 结束时输出 ffmpeg 自身的 CPU 时间 (需要 info 日志级别)，-nostats 关闭进度刷新
+    return stream.global_args('-hide_banner', '-nostats', '-loglevel', 'info', '-benchmark', '-xerror').overwrite_output().compile()
+
+def _encode_report(ffmpeg_log, audio_path):
+    """从 ffmpeg 的日志中取出编码耗时和音频时长，估算相对 128k 立体声节省的字节数。
+
+    估算基准优先用输入的时长 (裁掉的静音也算作节省)，输入时长未知时用输出的时长。
+    """
+    report = {"bytes": os.path.getsize(audio_path), "cpu_seconds": None, "duration": None, "baseline_bytes": None}
+    bench = re.search(r"bench: utime=([\d.]+)s stime=([\d.]+)s", ffmpeg_log)
+    if bench: report["cpu_seconds"] = float(bench.group(1)) + float(bench.group(2))
+    to_seconds = lambda hms: int(hms[0]) * 3600 + int(hms[1]) * 60 + float(hms[2])
+    output_times = re.findall(r"time=(\d+):(\d+):([\d.]+)", ffmpeg_log)
+    if output_times: report["duration"] = to_seconds(output_times[-1])
+    input_duration = re.search(r"Duration: (\d+):(\d+):([\d.]+)", ffmpeg_log)
+    baseline_seconds = to_seconds(input_duration.groups()) if input_duration else report["duration"]
+    if baseline_seconds:
+        report["baseline_bytes"] = int(baseline_seconds * int(STANDARD_AUDIO_BITRATE[:-1]) * 1000 / 8)
+    return report
+
+def _ffmpeg_error_text(ffmpeg_log):
+    lines = [line for line in ffmpeg_log.splitlines() if line.strip() and not line.startswith(("bench:", "size="))]
+    return "\n".join(lines)[-300:]
+
+def stream_extract_audio(video_url, title, aweme_id, content_index):
+    """边下载边把视频数据通过 stdin 交给 ffmpeg，只生成 MP3，完整的 MP4 不落盘。
+
+    MP4 的 moov 信息在文件末尾时 ffmpeg 无法从管道中解析，此时改为让 ffmpeg 直接读取视频 URL (可按 Range 跳转)。
+    返回 (状态, 音频路径, 编码报告)，编码报告见 _encode_report，没有编码时为 None。
+    """
+    duplicate_of = content_index.duplicate_of(aweme_id)
+    if duplicate_of:
+        return f"Duplicate_Content: 与 {duplicate_of} 内容相同", None, None
+    audio_path = os.path.join(DOWNLOAD_DIR, f"{media_file_stem(aweme_id, title)}.mp3")
+    # 文件名以 aweme_id 开头，已存在说明是之前完整提取的同一个视频的音频
+    if os.path.exists(audio_path):
+        return "Skipped_Audio_Exists", audio_path, None
+    headers = {'User-Agent': BROWSER_USER_AGENT, 'Referer': 'https://www.douyin.com/'}
+    temp_audio_path = os.path.join(DOWNLOAD_DIR, f"temp_{uuid.uuid4().hex}.mp3")
+    process = None
+    # ffmpeg 的日志写到临时文件而不是管道，避免日志较多时写满管道缓冲区、与下载互相等待
+    log_file = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(_audio_only_command('pipe:0', temp_audio_path), stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=log_file)
+        digest = hashlib.sha256()
+        pipe_open = True
+        # 大文件分段并发下载、按顺序写入 ffmpeg；传输中断时从断点继续，不必重新开始
+        for chunk in iter_ranged(video_url, headers):
+            digest.update(chunk)
+            if not pipe_open: continue
+            try:
+                process.stdin.write(chunk)
+            except BrokenPipeError:
+                pipe_open = False  # ffmpeg 已提前退出 (错误信息见 stderr)，继续读完以得到完整的内容哈希
+        process.communicate()
+        log_file.seek(0)
+        ffmpeg_log = log_file.read().decode('utf-8', errors='ignore')
+        if process.returncode != 0:
+            # 管道输入失败 (通常是 moov 在文件末尾)，退回到由 ffmpeg 直接读取 URL
+            header_lines = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+            input_args = {"headers": header_lines, "reconnect": 1, "reconnect_on_network_error": 1, "reconnect_delay_max": 5}
+            result = subprocess.run(_audio_only_command(video_url, temp_audio_path, input_args),
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=600)
+            fallback_log = result.stderr.decode('utf-8', errors='ignore')
+            if result.returncode != 0:
+                raise RuntimeError(_ffmpeg_error_text(fallback_log) or _ffmpeg_error_text(ffmpeg_log))
+            ffmpeg_log = fallback_log
+        duplicate_of = content_index.register(aweme_id, digest.hexdigest())
+        if duplicate_of:
+            os.remove(temp_audio_path)
+            return f"Duplicate_Content: 与 {duplicate_of} 内容相同", None, None
+        report = _encode_report(ffmpeg_log, temp_audio_path)
+        os.replace(temp_audio_path, audio_path)
+        return "Success", audio_path, report
+    except requests.exceptions.RequestException as e:
+        status = f"Download_Request_Error: {e}"
+    except Exception as e:
+        status = f"FFmpeg_Error: {e}"
+    finally:
+        log_file.close()
+    if process is not None and process.poll() is None:
+        process.kill()
+        process.wait()
+    if os.path.exists(temp_audio_path):
+        os.remove(temp_audio_path)
+    return status, None, None
+
 # --- 模块三：AI文案提取师 ---
 def extract_audio(video_path):
+    """返回 (状态, 音频路径, 编码报告)，编码参数取自 AUDIO_PROFILE。"""
     try:
-        audio_path = video_path.replace(".mp4", ".mp3")
-        if os.path.exists(audio_path): return "Skipped", audio_path
-        ffmpeg.input(video_path).output(audio_path, acodec='libmp3lame', audio_bitrate='128k').run(overwrite_output=True, quiet=True)
-        return "Success", audio_path
-    except Exception as e: return f"FFmpeg_Error: {e}", None
+        audio_path = os.path.splitext(video_path)[0] + ".mp3"
+        if os.path.exists(audio_path): return "Skipped", audio_path, None
+        result = subprocess.run(_audio_only_command(video_path, audio_path), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        ffmpeg_log = result.stderr.decode('utf-8', errors='ignore')
+        if result.returncode != 0: return f"FFmpeg_Error: {_ffmpeg_error_text(ffmpeg_log)}", None, None
+        return "Success", audio_path, _encode_report(ffmpeg_log, audio_path)
+    except Exception as e: return f"FFmpeg_Error: {e}", None, None
+
+class TranscriptCache:
+    """按 (aweme_id, 音频内容哈希) 保存转写结果的 SQLite 缓存，跨运行保留。
+
+    重跑或部分失败后再次转写同一段音频时直接返回上次的文案，不再上传音频、调用 API。
+    总大小超过 max_bytes 时按最近使用时间淘汰最旧的记录。可在多个线程和协程间共享。
+    """
+    def __init__(self, path=TRANSCRIPT_CACHE_FILE, max_bytes=int(TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (aweme_id TEXT NOT NULL, audio_hash TEXT NOT NULL, transcript TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (aweme_id, audio_hash))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_last_used ON transcripts (last_used)")
+        self._db.commit()
 
-def transcribe_audio(audio_path):
+    def get(self, aweme_id, audio_hash) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT transcript FROM transcripts WHERE aweme_id = ? AND audio_hash = ?",
+                                   (aweme_id or "", audio_hash)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE transcripts SET last_used = ? WHERE aweme_id = ? AND audio_hash = ?",
+                             (time.time(), aweme_id or "", audio_hash))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, aweme_id, audio_hash, transcript):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                             (aweme_id or "", audio_hash, transcript, len(transcript.encode('utf-8')), now, now))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes: return
+        stale = []
+        for aweme_id, audio_hash, size in self._db.execute("SELECT aweme_id, audio_hash, size FROM transcripts ORDER BY last_used"):
+            if total <= self.max_bytes: break
+            stale.append((aweme_id, audio_hash))
+            total -= size
+        self._db.executemany("DELETE FROM transcripts WHERE aweme_id = ? AND audio_hash = ?", stale)
+        self.evicted += len(stale)
+
+    def summary(self):
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts").fetchone()
+        return (f"转写缓存: 命中 {self.hits} / 未命中 {self.misses}，淘汰 {self.evicted} 条，"
+                f"现有 {count} 条 ({total / 1024 / 1024:.2f} MB)")
+
+    def close(self):
+        with self._lock: self._db.close()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""): digest.update(block)
+    return digest.hexdigest()
+
+def transcribe_audio(audio_path, aweme_id=None, cache=None):
+    """传入 cache 时先按 (aweme_id, 音频哈希) 查找缓存，命中时返回 ("Cached", 文案)；转写成功后写入缓存。"""
+    audio_hash = file_sha256(audio_path) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(aweme_id, audio_hash)
+        if cached is not None: return "Cached", cached
     if not SILICONFLOW_API_KEY or "xxx" in SILICONFLOW_API_KEY: return "No_API_Key", "错误：请在代码中填入你的SiliconFlow API Key！"
     try:
-        url = "https://api.siliconflow.cn/v1/audio/transcriptions"
         headers = {"Authorization": f"Bearer {SILICONFLOW_API_KEY}"}
-        payload = {"model": "FunAudioLLM/SenseVoiceSmall", "response_format": "text"}
+        payload = {"model": SILICONFLOW_ASR_MODEL, "response_format": "text"}
         with open(audio_path, "rb") as f:
             files = {"file": f}
-            response = requests.post(url, data=payload, files=files, headers=headers, timeout=300)
+            response = requests.post(SILICONFLOW_TRANSCRIBE_URL, data=payload, files=files, headers=headers, timeout=300)
         response.raise_for_status()
+        if cache is not None: cache.put(aweme_id, audio_hash, response.text)
         return "Success", response.text
     except requests.exceptions.HTTPError as e: return f"API_HTTP_Error_{e.response.status_code}", f"AI接口错误: {e.response.text}"
     except Exception as e: return f"Unknown_API_Error", f"调用AI接口时发生未知错误: {e}"
 
+class SiliconFlowTranscriber:
+    """transcribe_audio 的异步版本：所有转写请求复用同一个 httpx 连接池，同时在途的请求数不超过 max_concurrency。
+    未安装 httpx 时在线程中调用 transcribe_audio。返回值与 transcribe_audio 相同，命中 cache 时不占用并发名额。
+    """
+    def __init__(self, max_concurrency=PIPELINE_TRANSCRIBE_CONCURRENCY, timeout=300, cache=None):
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self._http = None
+        if httpx is not None:
+            self._http = httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=max_concurrency,
+                                                                                max_keepalive_connections=max_concurrency))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def transcribe(self, audio_path, aweme_id=None):
+        if self._http is None:
+            async with self._semaphore: return await asyncio.to_thread(transcribe_audio, audio_path, aweme_id, self.cache)
+        try:
+            with open(audio_path, "rb") as f: audio = f.read()
+        except Exception as e: return f"Unknown_API_Error", f"调用AI接口时发生未知错误: {e}"
+        audio_hash = hashlib.sha256(audio).hexdigest()
+        if self.cache is not None:
+            cached = self.cache.get(aweme_id, audio_hash)
+            if cached is not None: return "Cached", cached
+        async with self._semaphore:
+            if not SILICONFLOW_API_KEY or "xxx" in SILICONFLOW_API_KEY: return "No_API_Key", "错误：请在代码中填入你的SiliconFlow API Key！"
+            try:
+                response = await self._http.post(
+                    SILICONFLOW_TRANSCRIBE_URL, headers={"Authorization": f"Bearer {SILICONFLOW_API_KEY}"},
+                    data={"model": SILICONFLOW_ASR_MODEL, "response_format": "text"},
+                    files={"file": (os.path.basename(audio_path), audio)})
+                response.raise_for_status()
+                if self.cache is not None: self.cache.put(aweme_id, audio_hash, response.text)
+                return "Success", response.text
+            except httpx.HTTPStatusError as e: return f"API_HTTP_Error_{e.response.status_code}", f"AI接口错误: {e.response.text}"
+            except Exception as e: return f"Unknown_API_Error", f"调用AI接口时发生未知错误: {e}"
+
+    async def aclose(self):
+        if self._http is not None: await self._http.aclose()
+
+# --- 模块三（续）：下载 → 提取音频 → 转写 分阶段流水线 ---
+class StageStats:
+    """记录流水线单个阶段的处理数量和耗时，用于输出每个阶段的吞吐量。"""
+    def __init__(self, name):
+        self.name = name
+        self.succeeded = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start, end, ok):
+        if ok: self.succeeded += 1
+        else: self.failed += 1
+        self.busy_seconds += end - start
+        self.first_start = start if self.first_start is None else min(self.first_start, start)
+        self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def summary(self):
+        total = self.succeeded + self.failed
+        if not total: return f"{self.name}: 无任务"
+        active = max(self.last_end - self.first_start, 1e-6)
+        return (f"{self.name}: 成功 {self.succeeded} / 失败 {self.failed}，平均 {self.busy_seconds / total:.1f} 秒/个，"
+                f"活跃 {active:.1f} 秒，吞吐 {total / active * 60:.1f} 个/分钟")
+
+class AudioEncodeStats:
+    """汇总提取音频的编码报告：输出字节数、按 128k 立体声估算的字节数和 ffmpeg CPU 时间。"""
+    def __init__(self, profile):
+        self.profile = profile
+        self.count = 0
+        self.bytes = 0
+        self.baseline_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, report):
+        if not report: return
+        self.count += 1
+        self.bytes += report["bytes"]
+        self.baseline_bytes += report["baseline_bytes"] or report["bytes"]
+        self.cpu_seconds += report["cpu_seconds"] or 0.0
+
+    @staticmethod
+    def describe(report):
+        text = f"{report['bytes'] / 1024:.0f} KB"
+        if report["baseline_bytes"]:
+            text += f"，比 128k 立体声少 {max(0.0, 1 - report['bytes'] / report['baseline_bytes']) * 100:.0f}%"
+        if report["cpu_seconds"] is not None:
+            text += f"，ffmpeg CPU {report['cpu_seconds']:.2f} 秒"
+        return text
+
+    def summary(self):
+        if not self.count: return f"音频编码 ({self.profile}): 无新编码"
+        saved = max(0, self.baseline_bytes - self.bytes)
+        return (f"音频编码 ({self.profile}): {self.count} 个，共 {self.bytes / 1024 / 1024:.2f} MB，"
+                f"比 128k 立体声估算节省 {saved / 1024 / 1024:.2f} MB ({saved / max(self.baseline_bytes, 1) * 100:.0f}%)，"
+                f"ffmpeg CPU 合计 {self.cpu_seconds:.1f} 秒")
+
+class PipelineJob:
+    def __init__(self, video_info, log_list, label):
+        self.video_info = video_info
+        self.log_list = log_list
+        self.label = label
+        # 没有 aweme_id 时用视频地址作为去重键
+        self.aweme_id = video_info.get('aweme_id') or video_info['video_url']
+        self.video_path = None
+        self.audio_path = None
+        self.future = asyncio.get_running_loop().create_future()
+
+    def log(self, message):
+        log_message(self.log_list, f"  [{self.label}] {message}")
+
+    def finish(self, transcription):
+        if not self.future.done(): self.future.set_result(transcription)
+
+class VideoPipeline:
+    """把每个视频的 下载 → 提取音频 → 转写 拆成三个阶段，各阶段有独立的工作池，通过有界队列衔接：
+
+    - 下载: IO 线程池 (download_workers 个线程)；
+    - 提取音频: 进程池 (extract_workers 个进程，默认等于 CPU 核数)；
+    - 转写: SiliconFlowTranscriber，同时在途的请求不超过 transcribe_concurrency 个。
+
+    默认 (keep_video=False) 下载阶段直接调用 stream_extract_audio 边下载边提取音轨，MP4 不落盘，
+    视频跳过提取音频阶段直接进入转写；keep_video=True 时保存 MP4 并按原方式用进程池提取。
+
+    整个运行共享一个流水线，并发的主页通过 submit() 投递视频，因此一个视频在转写时，其他视频可以同时下载和提取音频。
+    submit() 返回视频文案 (转写失败时为失败说明)，下载或提取失败时返回 None。
+    """
+    def __init__(self, download_workers=PIPELINE_DOWNLOAD_WORKERS, extract_workers=PIPELINE_EXTRACT_WORKERS,
+                 transcribe_concurrency=PIPELINE_TRANSCRIBE_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE, keep_video=False,
+                 content_index=None, transcript_cache=None):
+        self.keep_video = keep_video
+        self.content_index = content_index if content_index is not None else VideoContentIndex()
+        self.transcript_cache = transcript_cache if transcript_cache is not None else TranscriptCache()
+        self.download_workers = max(1, download_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.transcribe_concurrency = max(1, transcribe_concurrency)
+        self.queue_size = max(1, queue_size)
+        self._cache_summary = None
+        self.stats = {"download": StageStats("下载" if keep_video else "下载并提取音频"), "extract": StageStats("提取音频"), "transcribe": StageStats("AI转写")}
+        self.audio_stats = AudioEncodeStats(AUDIO_PROFILE)
+        self._workers = []
+
+    async def __aenter__(self):
+        self._download_pool = ThreadPoolExecutor(self.download_workers, thread_name_prefix="download")
+        self._extract_pool = ProcessPoolExecutor(self.extract_workers)
+        self.transcriber = SiliconFlowTranscriber(self.transcribe_concurrency, cache=self.transcript_cache)
+        self._download_queue = asyncio.Queue(self.queue_size)
+        self._extract_queue = asyncio.Queue(self.queue_size)
+        self._transcribe_queue = asyncio.Queue(self.queue_size)
+        stages = [
+            ("download", self._download_queue, self._download, self._extract_queue, self.download_workers),
+            ("extract", self._extract_queue, self._extract, self._transcribe_queue, self.extract_workers),
+            ("transcribe", self._transcribe_queue, self._transcribe, None, self.transcribe_concurrency),
+        ]
+        for stage, queue, handler, next_queue, workers in stages:
+            self._workers += [asyncio.create_task(self._worker(stage, queue, handler, next_queue)) for _ in range(workers)]
+        return self
+
+    async def __aexit__(self, *exc):
+        for task in self._workers: task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._download_pool.shutdown(wait=False, cancel_futures=True)
+        self._extract_pool.shutdown(wait=False, cancel_futures=True)
+        await self.transcriber.aclose()
+        self._cache_summary = self.transcript_cache.summary()
+        self.transcript_cache.close()
+
+    async def submit(self, video_info, log_list, label):
+        job = PipelineJob(video_info, log_list, label)
+        await self._download_queue.put(job)
+        return await job.future
+
+    def summary(self):
+        cache_summary = self._cache_summary or self.transcript_cache.summary()
+        return [stats.summary() for stats in self.stats.values()] + [self.audio_stats.summary(), cache_summary]
+
+    async def _worker(self, stage, queue, handler, next_queue):
+        while True:
+            job = await queue.get()
+            start = time.perf_counter()
+            try:
+                ok = await handler(job)
+            except Exception as e:
+                job.log(f"❌ {self.stats[stage].name}阶段发生未知错误: {e}")
+                ok = False
+            self.stats[stage].record(start, time.perf_counter(), ok)
+            queue.task_done()
+            if not ok: job.finish(None)
+            elif next_queue is self._extract_queue and job.audio_path: await self._transcribe_queue.put(job)
+            elif next_queue is not None: await next_queue.put(job)
+
+    async def _download(self, job):
+        job.log(f"--- 开始处理: {job.video_info['title']} ---")
+        loop = asyncio.get_running_loop()
+        if not self.keep_video:
+            status, job.audio_path, report = await loop.run_in_executor(
+                self._download_pool, stream_extract_audio, job.video_info['video_url'], job.video_info['title'],
+                job.aweme_id, self.content_index)
+            if "Error" in status or status.startswith("Duplicate"):
+                job.log(f"⚠️  跳过下载: {status}")
+                return False
+            if status == "Skipped_Audio_Exists":
+                job.log("✅ 音频文件已存在，跳过下载")
+            else:
+                self.audio_stats.record(report)
+                job.log(f"✅ 边下载边提取音频成功: {job.audio_path} ({AudioEncodeStats.describe(report)})")
+            return True
+        status, job.video_path = await loop.run_in_executor(
+            self._download_pool, download_video, job.video_info['video_url'], job.video_info['title'],
+            job.aweme_id, self.content_index)
+        if "Error" in status or status.startswith("Duplicate"):
+            job.log(f"⚠️  跳过下载: {status}")
+            return False
+        elif status == "Skipped_Video_Exists":
+            job.log(f"✅ 文件已存在，直接使用: {job.video_path}")
+        else:
+            job.log(f"✅ 下载成功: {job.video_path}")
+        return True
+
+    async def _extract(self, job):
+        status, job.audio_path, report = await asyncio.get_running_loop().run_in_executor(self._extract_pool, extract_audio, job.video_path)
+        if "Error" in status:
+            job.log(f"❌ 音频提取失败: {status}")
+            return False
+        elif status == "Skipped":
+            job.log("✅ 音频文件已存在，跳过提取")
+        else:
+            self.audio_stats.record(report)
+            job.log(f"✅ 音频提取成功 ({AudioEncodeStats.describe(report)})")
+        return True
+
+    async def _transcribe(self, job):
+        status, transcription = await self.transcriber.transcribe(job.audio_path, job.aweme_id)
+        ok = "Error" not in status
+        if not ok:
+            job.log(f"❌ AI转写失败: {status} - {transcription}")
+            transcription = f"AI转写失败: {status}"
+        elif status == "Cached":
+            job.log("✅ 使用缓存的转写结果，跳过AI转写")
+        else:
+            job.log("✅ AI转写成功！")
+        job.log("--- 处理完成 ---")
+        job.finish(transcription)
+        return ok
+
 # --- 模块四：抖音API爬虫 ---
 class RequestHandler:
     def __init__(self):
@@ -426,9 +968,10 @@ class DouyinCrawler:
             return None
 
 # --- 模块五：总指挥 ---
-async def process_homepage(homepage_url, log_list, feishu_api, table_id, crawler):
+async def process_homepage(homepage_url, log_list, feishu_api, table_id, crawler, link_index, pipeline):
     log_message(log_list, f"➡️ 阶段1: 开始处理主页: {homepage_url}")
-    result = crawler.get_user_videos(homepage_url, max_videos=4)
+    # 爬取、下载、ffmpeg、转写和飞书读写都是阻塞调用，放到线程中执行，避免阻塞其他主页的协程
+    result = await asyncio.to_thread(crawler.get_user_videos, homepage_url, max_videos=4)
     
     if "error" in result:
         log_message(log_list, f"❌ 扫描失败: {result['error']}")
@@ -440,21 +983,18 @@ async def process_homepage(homepage_url, log_list, feishu_api, table_id, crawler
     log_message(log_list, f"✅ 扫描结束！作者: {author_name}, 共找到 {len(videos)} 个视频。")
     if not videos: return
 
-    # 【新增步骤】: 从飞书获取已存在的视频链接进行去重
-    log_message(log_list, "➡️ 准备工作: 从飞书获取已存在的视频链接以进行去重...")
+    # 【新增步骤】: 用整个运行共享的链接索引去重，只在第一次使用时从飞书 (或本地缓存) 加载
+    if not link_index.loaded:
+        log_message(log_list, "➡️ 准备工作: 加载已存在的视频链接以进行去重...")
     try:
-        existing_video_links = feishu_api.get_all_video_links(FEISHU_APP_TOKEN, table_id)
-        log_message(log_list, f"✅ 已获取 {len(existing_video_links)} 个现有链接。")
+        await asyncio.to_thread(link_index.load, log_list)
     except Exception as e:
         log_message(log_list, f"⚠️ 警告: 无法从飞书获取现有链接，将继续处理所有视频。错误: {e}")
-        existing_video_links = set() # 如果获取失败，则默认为空集合，不影响后续流程
 
     # 【修改步骤】: 筛选出新的、未被记录的视频
     original_video_count = len(videos)
-    videos_to_process = [
-        v for v in videos
-        if v.get('share_url') not in existing_video_links
-    ]
+    new_links = set(link_index.claim([v.get('share_url') for v in videos]))
+    videos_to_process = [v for v in videos if v.get('share_url') in new_links]
     new_video_count = len(videos_to_process)
     log_message(log_list, f"🔍 筛选完成: {original_video_count} 个视频中，有 {new_video_count} 个是新的，需要处理。")
     
@@ -462,81 +1002,45 @@ async def process_homepage(homepage_url, log_list, feishu_api, table_id, crawler
         log_message(log_list, "✅ 无新视频需要处理，任务完成。")
         return
         
-    log_message(log_list, "➡️ 阶段2: 开始逐一处理新视频...")
+    log_message(log_list, "➡️ 阶段2: 新视频进入 下载 → 提取音频 → 转写 流水线...")
+    transcriptions = await asyncio.gather(*(
+        pipeline.submit(video_info, log_list, f"{author_name} {i+1}/{new_video_count}")
+        for i, video_info in enumerate(videos_to_process)
+    ))
+    # 下载失败、内容重复或提取音频失败的视频不写入飞书；转写失败的视频写入失败说明
     all_results_for_feishu = []
-    downloaded_sizes = set()
-    
-    # 【修改步骤】: 循环处理筛选后的视频列表
-    for i, video_info in enumerate(videos_to_process):
-        log_message(log_list, f"--- ({i+1}/{new_video_count}) 开始处理: {video_info['title']} ---")
-        status, video_path = download_video(video_info['video_url'], video_info['title'], downloaded_sizes)
-        if "Error" in status or status == "Duplicate_Size":
-            log_message(log_list, f"  ⚠️  跳过下载: {status}")
-            continue
-        elif status == "Skipped_Title_Exists":
-            log_message(log_list, f"  ✅ 文件已存在，直接使用: {video_path}")
-        else:
-            log_message(log_list, f"  ✅ 下载成功: {video_path}")
-        
-        status, audio_path = extract_audio(video_path)
-        if "Error" in status:
-            log_message(log_list, f"  ❌ 音频提取失败: {status}")
-            continue
-        elif status == "Skipped":
-            log_message(log_list, "  ✅ 音频文件已存在，跳过提取")
-        else:
-            log_message(log_list, "  ✅ 音频提取成功")
-
-        status, transcription = transcribe_audio(audio_path)
-        if "Error" in status:
-             log_message(log_list, f"  ❌ AI转写失败: {status} - {transcription}")
-             transcription = f"AI转写失败: {status}"
-        else:
-             log_message(log_list, "  ✅ AI转写成功！")
-        
+    for video_info, transcription in zip(videos_to_process, transcriptions):
+        if transcription is None: continue
         all_results_for_feishu.append({
             "fields": {
                 "抖音名": author_name, "主页链接": homepage_url, "视频链接": video_info['share_url'],
                 "视频文案": transcription, "发布日期": video_info['create_time'] * 1000
             }
         })
-        log_message(log_list, f"--- ({i+1}/{new_video_count}) 处理完成 ---")
     
+    written_links = set()
     if all_results_for_feishu:
         log_message(log_list, "➡️ 阶段3: 开始批量写入飞书...")
         try:
-            feishu_api.add_records_batch(FEISHU_APP_TOKEN, table_id, all_results_for_feishu)
+            await asyncio.to_thread(feishu_api.add_records_batch, FEISHU_APP_TOKEN, table_id, all_results_for_feishu)
+            written_links = {r["fields"]["视频链接"] for r in all_results_for_feishu}
             log_message(log_list, f"✅ 成功批量写入 {len(all_results_for_feishu)} 条新记录到飞书！")
         except Exception as e:
             log_message(log_list, f"❌ 批量写入飞书失败: {e}")
+    link_index.commit(written_links)
+    link_index.release(new_links - written_links)
 
 # --- 添加从飞书API读取抖音主页链接的功能 ---
 def get_homepage_links_from_feishu(feishu_api, app_token, table_id, log_list):
     log_message(log_list, "➡️ 开始从飞书获取主页链接...")
     try:
-        token = feishu_api._get_tenant_access_token()
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/search"
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json; charset=utf-8"}
-        payload = {"page_size": 500, "field_names": ["主页链接"]}
         all_links = []
-        page_token = ""
-        while True:
-            if page_token: payload["page_token"] = page_token
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("code") != 0: raise Exception(f"获取飞书数据失败: {result.get('msg')}")
-            data = result.get("data", {})
-            items = data.get("items", [])
-            for item in items:
-                fields = item.get("fields", {})
-                homepage_link_field = fields.get("主页链接")
-                if isinstance(homepage_link_field, list) and len(homepage_link_field) > 0:
-                    link_obj = homepage_link_field[0]
-                    if isinstance(link_obj, dict) and "link" in link_obj: all_links.append(link_obj["link"])
-                elif isinstance(homepage_link_field, str): all_links.append(homepage_link_field)
-            page_token = data.get("page_token")
-            if not data.get("has_more"): break
+        for item in feishu_api.iter_records(app_token, table_id, field_names=["主页链接"], use_search=True):
+            homepage_link_field = item.fields.get("主页链接")
+            if isinstance(homepage_link_field, str): all_links.append(homepage_link_field)
+            else:
+                link = link_field_value(homepage_link_field)
+                if link: all_links.append(link)
         log_message(log_list, f"✅ 成功获取 {len(all_links)} 个主页链接")
         return all_links
     except Exception as e:
@@ -550,6 +1054,8 @@ async def main():
     parser.add_argument('--mode', type=str, choices=['homepage', 'batch'], default='batch', help='运行模式: homepage(单个主页), batch(批量处理飞书中的主页)')
     parser.add_argument('--url', type=str, help='抖音主页链接')
     parser.add_argument('--source-table', type=str, default='tblsx7s2wqtxscvJ', help='包含主页链接的飞书表格ID')
+    parser.add_argument('--concurrency', type=int, default=HOMEPAGE_CONCURRENCY, help='batch 模式下同时处理的主页数量')
+    parser.add_argument('--keep-video', action='store_true', help='保存完整的 MP4 文件 (默认边下载边提取音频，不保存视频)')
     args = parser.parse_args()
     print(f"--- 参数解析完成: mode={args.mode} ---")
     
@@ -562,12 +1068,15 @@ async def main():
     log_message(log_list, f"✅ {message}")
 
     if not os.path.exists(DOWNLOAD_DIR): os.makedirs(DOWNLOAD_DIR)
+    stale_parts = remove_stale_parts(DOWNLOAD_DIR)
+    if stale_parts: log_message(log_list, f"🧹 已清理 {stale_parts} 个长时间未完成的下载临时文件。")
     
     print("--- 初始化API... ---")
     try:
         feishu_api = FeishuAPI(FEISHU_APP_ID, FEISHU_APP_SECRET)
         target_table_id = FEISHU_TABLE_ID or feishu_api.get_first_table_id(FEISHU_APP_TOKEN)
         crawler = DouyinCrawler()
+        link_index = VideoLinkIndex(feishu_api, FEISHU_APP_TOKEN, target_table_id)
         log_message(log_list, f"✅ API初始化成功，将写入数据表: {target_table_id}")
     except Exception as e:
         log_message(log_list, f"❌ API初始化失败: {e}")
@@ -578,18 +1087,45 @@ async def main():
         if not args.url:
             log_message(log_list, "❌ 错误：主页处理模式需要提供 --url 参数")
             return
-        await process_homepage(args.url, log_list, feishu_api, target_table_id, crawler)
+        async with VideoPipeline(keep_video=args.keep_video) as pipeline:
+            await process_homepage(args.url, log_list, feishu_api, target_table_id, crawler, link_index, pipeline)
+        for line in pipeline.summary(): log_message(log_list, f"📊 {line}")
     
     elif args.mode == 'batch':
-        homepage_links = get_homepage_links_from_feishu(feishu_api, FEISHU_APP_TOKEN, args.source_table, log_list)
+        homepage_links = await asyncio.to_thread(get_homepage_links_from_feishu, feishu_api, FEISHU_APP_TOKEN, args.source_table, log_list)
         if not homepage_links:
             log_message(log_list, "❌ 未从飞书中获取到任何主页链接")
             return
         
-        for i, homepage_url in enumerate(homepage_links):
-            await process_homepage(homepage_url, log_list, feishu_api, target_table_id, crawler)
-            log_message(log_list, f"✅ ({i+1}/{len(homepage_links)}) 主页处理完成: {homepage_url}")
+        concurrency = max(1, args.concurrency)
+        log_message(log_list, f"➡️ 共 {len(homepage_links)} 个主页，同时处理 {concurrency} 个...")
+        pipeline = VideoPipeline(keep_video=args.keep_video)
+        if args.keep_video:
+            log_message(log_list, f"➡️ 流水线: 下载 {pipeline.download_workers} 线程，提取音频 {pipeline.extract_workers} 进程，"
+                                  f"转写并发 {pipeline.transcribe_concurrency}")
+        else:
+            log_message(log_list, f"➡️ 流水线: 边下载边提取音频 {pipeline.download_workers} 线程 (不保存视频)，"
+                                  f"转写并发 {pipeline.transcribe_concurrency}")
+        semaphore = asyncio.Semaphore(concurrency)
+        finished = 0
+        batch_start = time.time()
+
+        async def run_homepage(homepage_url):
+            nonlocal finished
+            async with semaphore:
+                try:
+                    await process_homepage(homepage_url, log_list, feishu_api, target_table_id, crawler, link_index, pipeline)
+                except Exception as e:
+                    log_message(log_list, f"❌ 处理主页时发生未知错误: {homepage_url} - {e}")
+            finished += 1
+            log_message(log_list, f"✅ ({finished}/{len(homepage_links)}) 主页处理完成: {homepage_url}")
+
+        async with pipeline:
+            await asyncio.gather(*(run_homepage(url) for url in homepage_links))
+        log_message(log_list, f"✅ 全部主页处理完成，耗时 {time.time() - batch_start:.1f} 秒。")
+        for line in pipeline.summary(): log_message(log_list, f"📊 {line}")
 
+    print(feishu_api.stats.summary())
     print("\n--- 所有任务执行完毕 ---")
 
 if __name__ == "__main__":
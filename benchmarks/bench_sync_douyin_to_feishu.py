@@ -0,0 +1,88 @@
+"""sync_douyin_to_feishu.py 的离线吞吐压测。
+
+在本机启动模拟的抖音 / 飞书接口，用 N 家门店、M 个商品的合成数据完整运行一次 main()，
+输出总耗时、各接口请求数以及每秒处理的记录数，不会访问任何线上服务。
+
+用法示例:
+    python benchmarks/bench_sync_douyin_to_feishu.py --stores 300 --products 5000 --latency 0.05
+    python benchmarks/bench_sync_douyin_to_feishu.py --concurrency 1 --batch-size 1   # 对比逐店串行
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_apis import FakeBitableAPI, FakeDouyinAPI
+
+TARGET_FIELD_NAME = "商品ID"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="抖音→飞书商品同步离线压测")
+    parser.add_argument("--stores", type=int, default=200, help="门店数量 N")
+    parser.add_argument("--products", type=int, default=3000, help="商品总数 M")
+    parser.add_argument("--per-store", type=int, default=150, help="每家门店在售的商品数")
+    parser.add_argument("--existing", type=float, default=0.5, help="飞书表格中已存在的商品比例 (0~1)")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟接口每个请求的延迟 (秒)")
+    parser.add_argument("--douyin-rps", type=int, default=0, help="模拟抖音接口每秒最多放行的请求数，0 表示不限")
+    parser.add_argument("--feishu-rps", type=int, default=0, help="模拟飞书接口每秒最多放行的请求数，0 表示不限")
+    parser.add_argument("--concurrency", type=int, help="覆盖 POI_FETCH_CONCURRENCY")
+    parser.add_argument("--batch-size", type=int, help="覆盖 POI_BATCH_SIZE")
+    parser.add_argument("--client-rps", type=float, default=0, help="覆盖 DOUYIN_MAX_RPS (客户端限速)，0 表示不限")
+    return parser.parse_args()
+
+
+def print_report(title, fake):
+    print(f"  [{title}]")
+    for name, count in sorted(fake.requests.items()):
+        print(f"    {name:<32} {count:>6} 次")
+    for name, count in sorted(fake.rejected.items()):
+        print(f"    {name:<32} {count:>6} 次被限流 (429)")
+    print(f"    {'响应字节数':<29} {fake.bytes_sent:>10}")
+
+
+def main():
+    args = parse_args()
+    douyin = FakeDouyinAPI(args.stores, args.products, args.per_store, latency=args.latency, max_rps=args.douyin_rps).start()
+    all_products = set()
+    for i in range(args.stores):
+        all_products |= douyin.products_for_store(i)
+    existing = sorted(all_products)[:int(len(all_products) * args.existing)]
+    bitable = FakeBitableAPI(TARGET_FIELD_NAME, existing, latency=args.latency, max_rps=args.feishu_rps).start()
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        os.environ.update({
+            "DOUYIN_APP_ID": "bench", "DOUYIN_APP_SECRET": "bench",
+            "FEISHU_APP_ID": "bench", "FEISHU_APP_SECRET": "bench",
+            "DOUYIN_API_BASE": douyin.base_url, "FEISHU_API_BASE": bitable.base_url,
+            "DOUYIN_MAX_RPS": str(args.client_rps),
+            "FEISHU_INDEX_FILE": os.path.join(state_dir, "feishu_product_ids.sqlite3"),
+            "POI_CACHE_FILE": os.path.join(state_dir, "douyin_poi_cache.json"),
+        })
+        if args.concurrency is not None: os.environ["POI_FETCH_CONCURRENCY"] = str(args.concurrency)
+        if args.batch_size is not None: os.environ["POI_BATCH_SIZE"] = str(args.batch_size)
+        sync = importlib.import_module("sync_douyin_to_feishu")
+
+        start = time.perf_counter()
+        sync.main()
+        elapsed = time.perf_counter() - start
+
+    written = len(bitable.records) - len(existing)
+    print("\n" + "=" * 60)
+    print(f"压测结果: {args.stores} 家门店, {len(all_products)} 个不同商品, 飞书已有 {len(existing)} 个")
+    print(f"  总耗时: {elapsed:.2f} 秒")
+    print(f"  新写入记录: {written} 条 (期望 {len(all_products) - len(existing)} 条)")
+    print(f"  写入吞吐: {written / elapsed:.1f} 条/秒")
+    print(f"  抓取吞吐: {douyin.products_served / elapsed:.1f} 条商品结果/秒 (共 {douyin.products_served} 条)")
+    print_report("抖音模拟接口", douyin)
+    print_report("飞书模拟接口", bitable)
+    douyin.stop()
+    bitable.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""本地模拟的抖音开放平台、抖音来客页面与飞书多维表格接口，供压测和离线验证使用，不会访问任何线上服务。
+
+每个模拟服务运行在后台线程中，可以给每个请求加固定延迟 (模拟网络往返)，
+也可以限制每秒请求数 (超出时返回 HTTP 429)，并按接口统计请求次数。
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class RateCap:
+    """固定窗口限流：每秒最多放行 max_rps 个请求，max_rps <= 0 表示不限流。"""
+    def __init__(self, max_rps):
+        self.max_rps = max_rps
+        self._lock = threading.Lock()
+        self._window = None
+        self._count = 0
+
+    def allow(self):
+        if self.max_rps <= 0: return True
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._count = window, 0
+            self._count += 1
+            return self._count <= self.max_rps
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _dispatch(self, method):
+        fake = self.server.fake
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        route = fake.match(method, parsed.path)
+        name = route[0] if route else f"{method} {parsed.path}"
+        if fake.latency > 0:
+            time.sleep(fake.latency)
+        if not fake.rate_cap.allow():
+            fake.count(name, rejected=True)
+            return self._send(429, {"code": 99991400, "msg": "request trigger frequency limit"})
+        fake.count(name)
+        if not route:
+            return self._send(404, {"code": 404, "msg": f"no fake route for {method} {parsed.path}"})
+        _, handler, match = route
+        status, payload = handler(parse_qs(parsed.query), body, match)
+        self._send(status, payload)
+
+    def _send(self, status, payload):
+        # 字符串按 HTML 页面返回，其余按 JSON 返回
+        is_html = isinstance(payload, str)
+        data = payload.encode("utf-8") if is_html else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.server.fake.count_bytes(len(data))
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8" if is_html else "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self): self._dispatch("GET")
+    def do_POST(self): self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeServer:
+    """在后台线程运行的本地 HTTP 服务。子类通过 self.route() 注册接口。"""
+    def __init__(self, latency=0.0, max_rps=0):
+        self.latency = latency
+        self.rate_cap = RateCap(max_rps)
+        self.requests = Counter()
+        self.rejected = Counter()
+        self.bytes_sent = 0
+        self._routes = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def route(self, method, pattern, name, handler):
+        self._routes.append((method, re.compile(pattern + "$"), name, handler))
+
+    def match(self, method, path):
+        for route_method, pattern, name, handler in self._routes:
+            m = pattern.match(path)
+            if route_method == method and m:
+                return name, handler, m
+        return None
+
+    def count(self, name, rejected=False):
+        with self._lock:
+            (self.rejected if rejected else self.requests)[name] += 1
+
+    def count_bytes(self, n):
+        with self._lock:
+            self.bytes_sent += n
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class FakeDouyinAPI(FakeServer):
+    """模拟 client_token、门店查询 (poi/query) 和在线商品查询 (product/online/query)。
+
+    第 i 家门店在售的商品为从 i * stride 开始的连续 products_per_store 个商品 (对 product_count 取模)，
+    因此相邻门店之间的商品大量重叠，和连锁门店共享商品库的情况类似。
+    """
+    def __init__(self, store_count, product_count, products_per_store, **kwargs):
+        super().__init__(**kwargs)
+        self.store_count = store_count
+        self.product_count = max(1, product_count)
+        self.products_per_store = min(products_per_store, self.product_count)
+        self.stride = max(1, self.product_count // max(1, store_count))
+        self.products_served = 0
+        self.route("POST", r"/oauth/client_token/", "douyin client_token", self._client_token)
+        self.route("GET", r"/goodlife/v1/shop/poi/query/", "douyin poi/query", self._poi_query)
+        self.route("GET", r"/goodlife/v1/goods/product/online/query/", "douyin product/online/query", self._product_query)
+
+    def poi_id(self, i):
+        return str(7000000000000000000 + i)
+
+    def products_for_store(self, i):
+        start = i * self.stride
+        return {f"{1000000000000000000 + (start + j) % self.product_count}" for j in range(self.products_per_store)}
+
+    def _client_token(self, query, body, match):
+        return 200, {"data": {"access_token": "fake-douyin-token", "error_code": 0, "expires_in": 7200}}
+
+    def _poi_query(self, query, body, match):
+        page = int(query.get("page", ["1"])[0])
+        size = int(query.get("size", ["50"])[0])
+        ids = range((page - 1) * size, min(page * size, self.store_count))
+        pois = [{"poi": {"poi_id": self.poi_id(i)}} for i in ids]
+        return 200, {"data": {"error_code": 0, "pois": pois, "total": self.store_count}}
+
+    def _product_query(self, query, body, match):
+        poi_ids = [p for value in query.get("poi_ids", []) for p in value.split(",")]
+        count = int(query.get("count", ["50"])[0])
+        offset = int(query.get("cursor", ["0"])[0] or 0)
+        products = set()
+        for poi_id in poi_ids:
+            products |= self.products_for_store(int(poi_id) - 7000000000000000000)
+        page = sorted(products)[offset:offset + count]
+        with self._lock:
+            self.products_served += len(page)
+        has_more = offset + count < len(products)
+        return 200, {"data": {
+            "error_code": 0,
+            "products": [{"product": {"product_id": pid}} for pid in page],
+            "has_more": has_more,
+            "next_cursor": str(offset + count) if has_more else "",
+        }}
+
+
+class FakeBitableAPI(FakeServer):
+    """模拟飞书 tenant_access_token、多维表格 records/search 与 records/batch_create。
+
+    表格只有一个文本字段 field_name；batch_create 超过 500 条时按飞书的行为返回业务错误，
+    带 client_token 的重复请求返回第一次的结果而不再新增。lose_create_responses 为前 N 次 batch_create
+    写入成功后返回 502 (模拟写入后响应丢失)。
+    """
+    BATCH_LIMIT = 500
+
+    def __init__(self, field_name, existing_values=(), lose_create_responses=0, **kwargs):
+        super().__init__(**kwargs)
+        self.field_name = field_name
+        self.records = list(existing_values)
+        self.lose_create_responses = lose_create_responses
+        self.created_by_token = {}
+        self.route("POST", r"/open-apis/auth/v3/tenant_access_token/internal/?", "feishu tenant_access_token", self._tenant_token)
+        self.route("POST", r"/open-apis/auth/v3/app_access_token/internal/?", "feishu app_access_token", self._app_token)
+        self.route("POST", r"/open-apis/bitable/v1/apps/[^/]+/tables/[^/]+/records/search", "feishu records/search", self._search)
+        self.route("POST", r"/open-apis/bitable/v1/apps/[^/]+/tables/[^/]+/records/batch_create", "feishu records/batch_create", self._batch_create)
+
+    def _tenant_token(self, query, body, match):
+        return 200, {"code": 0, "msg": "ok", "tenant_access_token": "t-fake", "expire": 7200}
+
+    def _app_token(self, query, body, match):
+        return 200, {"code": 0, "msg": "ok", "app_access_token": "a-fake", "tenant_access_token": "t-fake", "expire": 7200}
+
+    def _search(self, query, body, match):
+        page_size = int(query.get("page_size", ["20"])[0])
+        offset = int(query.get("page_token", ["0"])[0] or 0)
+        with self._lock:
+            page = self.records[offset:offset + page_size]
+            total = len(self.records)
+        has_more = offset + page_size < total
+        items = [{"record_id": f"rec{offset + i}", "fields": {self.field_name: [{"text": value, "type": "text"}]}}
+                 for i, value in enumerate(page)]
+        return 200, {"code": 0, "msg": "success", "data": {
+            "items": items, "has_more": has_more, "page_token": str(offset + page_size) if has_more else "", "total": total,
+        }}
+
+    def _batch_create(self, query, body, match):
+        records = body.get("records", [])
+        if len(records) > self.BATCH_LIMIT:
+            return 200, {"code": 1254104, "msg": "BatchCreateRecordsExceedLimit"}
+        client_token = query.get("client_token", [None])[0]
+        with self._lock:
+            if client_token in self.created_by_token:
+                return 200, {"code": 0, "msg": "success", "data": {"records": self.created_by_token[client_token]}}
+            start = len(self.records)
+            self.records.extend(r.get("fields", {}).get(self.field_name) for r in records)
+            created = [{"record_id": f"rec{start + i}", "fields": r.get("fields", {})} for i, r in enumerate(records)]
+            if client_token: self.created_by_token[client_token] = created
+            if self.lose_create_responses:
+                self.lose_create_responses -= 1
+                return 502, "<html>502 Bad Gateway</html>"
+        return 200, {"code": 0, "msg": "success", "data": {"records": created}}
+
+
+class FakeStorePage(FakeServer):
+    """模拟抖音来客的门店管理页：页面加载后只用 fetch 请求前 loaded_pages 页门店列表 (和真实页面一样，其余分页要翻页才会请求)。
+
+    列表接口的 data 中除了 poi_list 还有带 poi_name 的推荐门店，用来确认截获时只读取门店列表本身。
+    用于离线验证 更新门店数据.py 的网络截获模式，例如:
+        DOUYIN_ACQUIRE_MODE=capture DOUYIN_TARGET_URL=<base_url>/p/poi-manage/home
+    """
+    PAGE = """<!doctype html><html><body><div id="stores"></div><script>
+    (async () => {
+      for (let page = 1; page <= %(loaded_pages)d; page++) {
+        const resp = await fetch(`/life/shop/poi/list?page=${page}&page_size=%(page_size)d`);
+        const body = await resp.json();
+        for (const poi of body.data.poi_list) {
+          const row = document.createElement("div"); row.textContent = poi.poi_name;
+          document.getElementById("stores").appendChild(row);
+        }
+        if (!body.data.has_more) break;
+      }
+    })();
+    </script></body></html>"""
+
+    def __init__(self, store_names, page_size=20, loaded_pages=1, **kwargs):
+        super().__init__(**kwargs)
+        self.store_names = list(store_names)
+        self.page_size = page_size
+        self.loaded_pages = loaded_pages
+        self.route("GET", r"/p/poi-manage/home", "store page", self._page)
+        self.route("GET", r"/life/shop/poi/list", "store list", self._list)
+
+    def _page(self, query, body, match):
+        return 200, self.PAGE % {"page_size": self.page_size, "loaded_pages": self.loaded_pages}
+
+    def _list(self, query, body, match):
+        page = int(query.get("page", ["1"])[0])
+        page_size = int(query.get("page_size", [str(self.page_size)])[0])
+        rows = self.store_names[(page - 1) * page_size:page * page_size]
+        return 200, {"status_code": 0, "data": {
+            "poi_list": [{"poi_id": str(i), "poi_name": name} for i, name in enumerate(rows)],
+            "recommend_list": [{"poi_id": "r1", "poi_name": "推荐门店 (不属于本账号)"}],
+            "total": len(self.store_names),
+            "has_more": page * page_size < len(self.store_names),
+        }}
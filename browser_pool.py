@@ -0,0 +1,293 @@
+"""Playwright 爬虫共用的浏览器服务。
+
+- 每个进程只启动一个 Chromium (不再使用 slow_mo)，按 Cookie 文件缓存已登录的 BrowserContext，
+  页面用完后放回池中复用，同时在用的页面数有上限。
+- 设置 BROWSER_CDP_ENDPOINT 后改为连接一个常驻的 Chromium，多个脚本先后或同时运行时
+  都不必再付浏览器启动和登录准备的开销。常驻浏览器可用 `python browser_pool.py serve` 启动。
+- 默认使用精简加载配置 (BROWSER_RESOURCE_PROFILE=lean)：拦截图片、音视频、字体和统计上报请求，
+  只放行页面本身和数据接口，并统计拦截的请求数与实际加载的字节数。设为 full 时不做任何拦截。
+- Cookie 文件既可以是 Playwright 的 storage_state (含 "cookies" 键)，也可以是浏览器插件导出的 Cookie 列表。
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+from playwright.sync_api import sync_playwright
+
+BROWSER_CDP_ENDPOINT = os.getenv("BROWSER_CDP_ENDPOINT")
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "4"))
+BROWSER_CDP_PORT = int(os.getenv("BROWSER_CDP_PORT", "9222"))
+# lean: 拦截下面列出的资源类型和统计上报域名；full: 不拦截
+BROWSER_RESOURCE_PROFILE = os.getenv("BROWSER_RESOURCE_PROFILE", "lean")
+BROWSER_BLOCK_RESOURCE_TYPES = os.getenv("BROWSER_BLOCK_RESOURCE_TYPES", "image,media,font")
+BROWSER_BLOCK_HOSTS = os.getenv(
+    "BROWSER_BLOCK_HOSTS",
+    "mcs.zijieapi.com,mon.zijieapi.com,mcs.snssdk.com,mon.snssdk.com,hm.baidu.com,www.google-analytics.com,www.googletagmanager.com",
+)
+
+
+def normalize_cookies(cookies_raw: List[Dict]) -> List[Dict]:
+    """把浏览器插件导出的 Cookie 转成 Playwright 接受的格式 (修正 sameSite、expirationDate 等字段)。"""
+    corrected_cookies = []
+    for cookie in cookies_raw:
+        if not isinstance(cookie, dict): continue
+        if 'name' not in cookie or 'value' not in cookie: continue
+        cookie = dict(cookie)
+        secure = cookie.get('secure', False)
+        same_site = cookie.get('sameSite')
+        same_site_map = {'no_restriction': 'None', 'none': 'None', 'lax': 'Lax', 'strict': 'Strict'}
+        if isinstance(same_site, str) and same_site.lower() in same_site_map:
+            cookie['sameSite'] = same_site_map[same_site.lower()]
+        else:
+            cookie['sameSite'] = 'None' if secure else 'Lax'
+        if 'expirationDate' in cookie:
+            if isinstance(cookie['expirationDate'], (int, float)): cookie['expires'] = int(cookie['expirationDate'])
+            del cookie['expirationDate']
+        for key in ('storeId', 'hostOnly', 'session', 'id'):
+            cookie.pop(key, None)
+        corrected_cookies.append(cookie)
+    return corrected_cookies
+
+
+def load_storage_state(cookie_file: str) -> Dict:
+    """读取 Cookie 文件并返回可直接用于 new_context(storage_state=...) 的字典。"""
+    with open(cookie_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'cookies' in data:
+        return {"cookies": normalize_cookies(data['cookies']), "origins": data.get('origins', [])}
+    if isinstance(data, list):
+        return {"cookies": normalize_cookies(data), "origins": []}
+    raise ValueError(f"无法识别的 Cookie 文件格式: {cookie_file}")
+
+
+class ResourceProfile:
+    """页面加载配置：决定哪些请求被拦截，并统计拦截的请求数和实际加载的响应字节数。
+
+    block_hosts 中的域名同时匹配其子域名。
+    """
+    def __init__(self, name: str = BROWSER_RESOURCE_PROFILE, block_types: str = BROWSER_BLOCK_RESOURCE_TYPES,
+                 block_hosts: str = BROWSER_BLOCK_HOSTS):
+        self.name = name
+        self.enabled = name == "lean"
+        self.block_types = {t.strip() for t in block_types.split(",") if t.strip()}
+        self.block_hosts = tuple(h.strip().lower() for h in block_hosts.split(",") if h.strip())
+        self.blocked = Counter()
+        self.loaded_requests = 0
+        self.loaded_bytes = 0
+
+    def should_block(self, request) -> Optional[str]:
+        """返回拦截原因 (资源类型或 'tracker')，不拦截时返回 None。"""
+        if request.resource_type in self.block_types:
+            return request.resource_type
+        host = (urlparse(request.url).hostname or "").lower()
+        if any(host == h or host.endswith("." + h) for h in self.block_hosts):
+            return "tracker"
+        return None
+
+    def on_response(self, response):
+        self.loaded_requests += 1
+        try:
+            self.loaded_bytes += int(response.headers.get("content-length") or 0)
+        except ValueError:
+            pass
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return f"页面加载配置: {self.name}，未拦截任何请求；共加载 {self.loaded_requests} 个响应 / {self.loaded_bytes / 1024:.1f} KB。"
+        blocked = "，".join(f"{k} {v}" for k, v in self.blocked.most_common()) or "无"
+        return (f"页面加载配置: {self.name}，拦截 {sum(self.blocked.values())} 个请求 ({blocked})；"
+                f"实际加载 {self.loaded_requests} 个响应 / {self.loaded_bytes / 1024:.1f} KB。")
+
+
+class AsyncBrowserPool:
+    """异步版浏览器池 (playwright.async_api)。用法:
+
+        async with AsyncBrowserPool() as pool:
+            async with pool.page('来客.json') as page:
+                await page.goto(url)
+    """
+    def __init__(self, headless: bool = True, cdp_endpoint: Optional[str] = BROWSER_CDP_ENDPOINT, max_pages: int = BROWSER_MAX_PAGES,
+                 profile: Optional[ResourceProfile] = None):
+        self.headless = headless
+        self.cdp_endpoint = cdp_endpoint
+        self.profile = profile or ResourceProfile()
+        self._semaphore = asyncio.Semaphore(max(1, max_pages))
+        self._playwright = None
+        self.browser = None
+        self._contexts = {}
+        self._idle_pages = {}
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        if self.browser: return
+        self._playwright = await async_playwright().start()
+        if self.cdp_endpoint:
+            self.browser = await self._playwright.chromium.connect_over_cdp(self.cdp_endpoint)
+        else:
+            self.browser = await self._playwright.chromium.launch(headless=self.headless)
+
+    async def context(self, cookie_file: Optional[str] = None, **context_kwargs):
+        """返回按 (Cookie 文件, 参数) 缓存的 BrowserContext，首次使用时从 storage_state 创建。"""
+        key = (cookie_file, json.dumps(context_kwargs, sort_keys=True))
+        async with self._lock:
+            if key not in self._contexts:
+                if cookie_file:
+                    context_kwargs["storage_state"] = load_storage_state(cookie_file)
+                if self.profile.enabled:
+                    # Service Worker 发出的请求不经过 route，需要禁用
+                    context_kwargs.setdefault("service_workers", "block")
+                context = await self.browser.new_context(**context_kwargs)
+                context.on("response", self.profile.on_response)
+                if self.profile.enabled:
+                    await context.route("**/*", self._route)
+                self._contexts[key] = context
+                self._idle_pages[key] = []
+            return key, self._contexts[key]
+
+    async def _route(self, route):
+        reason = self.profile.should_block(route.request)
+        if reason:
+            self.profile.blocked[reason] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @asynccontextmanager
+    async def page(self, cookie_file: Optional[str] = None, **context_kwargs):
+        """从池中取一个已登录的页面，用完后清空并放回池中。"""
+        async with self._semaphore:
+            key, context = await self.context(cookie_file, **context_kwargs)
+            idle = self._idle_pages[key]
+            page = idle.pop() if idle else await context.new_page()
+            try:
+                yield page
+            finally:
+                if not page.is_closed():
+                    try:
+                        await page.goto("about:blank")
+                        idle.append(page)
+                    except Exception:
+                        await page.close()
+
+    async def close(self):
+        for context in self._contexts.values():
+            try: await context.close()
+            except Exception: pass
+        self._contexts.clear()
+        self._idle_pages.clear()
+        # 连接常驻浏览器时 close() 只会断开连接，不会关闭浏览器进程
+        if self.browser: await self.browser.close()
+        if self._playwright: await self._playwright.stop()
+        self.browser = self._playwright = None
+
+
+class SyncBrowserPool:
+    """同步版浏览器池 (playwright.sync_api)，接口与 AsyncBrowserPool 一致。"""
+    def __init__(self, headless: bool = True, cdp_endpoint: Optional[str] = BROWSER_CDP_ENDPOINT, max_pages: int = BROWSER_MAX_PAGES,
+                 profile: Optional[ResourceProfile] = None):
+        self.headless = headless
+        self.cdp_endpoint = cdp_endpoint
+        self.profile = profile or ResourceProfile()
+        self._semaphore = threading.Semaphore(max(1, max_pages))
+        self._playwright = None
+        self.browser = None
+        self._contexts = {}
+        self._idle_pages = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        if self.browser: return
+        self._playwright = sync_playwright().start()
+        if self.cdp_endpoint:
+            self.browser = self._playwright.chromium.connect_over_cdp(self.cdp_endpoint)
+        else:
+            self.browser = self._playwright.chromium.launch(headless=self.headless)
+
+    def context(self, cookie_file: Optional[str] = None, **context_kwargs):
+        key = (cookie_file, json.dumps(context_kwargs, sort_keys=True))
+        if key not in self._contexts:
+            if cookie_file:
+                context_kwargs["storage_state"] = load_storage_state(cookie_file)
+            if self.profile.enabled:
+                context_kwargs.setdefault("service_workers", "block")
+            context = self.browser.new_context(**context_kwargs)
+            context.on("response", self.profile.on_response)
+            if self.profile.enabled:
+                context.route("**/*", self._route)
+            self._contexts[key] = context
+            self._idle_pages[key] = []
+        return key, self._contexts[key]
+
+    def _route(self, route):
+        reason = self.profile.should_block(route.request)
+        if reason:
+            self.profile.blocked[reason] += 1
+            route.abort()
+        else:
+            route.continue_()
+
+    @contextmanager
+    def page(self, cookie_file: Optional[str] = None, **context_kwargs):
+        with self._semaphore:
+            key, context = self.context(cookie_file, **context_kwargs)
+            idle = self._idle_pages[key]
+            page = idle.pop() if idle else context.new_page()
+            try:
+                yield page
+            finally:
+                if not page.is_closed():
+                    try:
+                        page.goto("about:blank")
+                        idle.append(page)
+                    except Exception:
+                        page.close()
+
+    def close(self):
+        for context in self._contexts.values():
+            try: context.close()
+            except Exception: pass
+        self._contexts.clear()
+        self._idle_pages.clear()
+        if self.browser: self.browser.close()
+        if self._playwright: self._playwright.stop()
+        self.browser = self._playwright = None
+
+
+def serve(port: int = BROWSER_CDP_PORT, headless: bool = True):
+    """启动一个常驻 Chromium，供其他脚本通过 BROWSER_CDP_ENDPOINT 连接，Ctrl+C 退出。"""
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless, args=[f"--remote-debugging-port={port}"])
+        print(f"常驻浏览器已启动，请设置 BROWSER_CDP_ENDPOINT=http://127.0.0.1:{port}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            browser.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve()
+    else:
+        print("用法: python browser_pool.py serve")
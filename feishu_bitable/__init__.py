@@ -0,0 +1,20 @@
+"""仓库内所有脚本共用的飞书多维表格访问层。
+
+- BitableClient: 同步客户端 (requests 连接池)，供 1109抖音.py、生成每日简报.py、jingchaowandata.py、sync_douyin_to_feishu.py 使用；
+- AsyncBitableClient: 原生 asyncio 客户端 (httpx)，供 更新门店数据.py 使用，未安装 httpx 时为 None；
+- 两者都缓存 tenant_access_token、提供预取下一页的 iter_records、按 500 条自动分块的批量写入，
+  并把每个接口的请求次数和耗时记录到 RequestStats (client.stats.summary())。
+"""
+from .client import BitableClient
+from .response import BATCH_LIMIT, FEISHU_BASE_URL, BitableError, BitableResponse, field_text
+from .stats import RequestStats
+
+try:
+    from .async_client import AsyncBitableClient
+except ImportError:  # 未安装 httpx
+    AsyncBitableClient = None
+
+__all__ = [
+    "AsyncBitableClient", "BATCH_LIMIT", "BitableClient", "BitableError", "BitableResponse",
+    "FEISHU_BASE_URL", "RequestStats", "field_text",
+]
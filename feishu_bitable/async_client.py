@@ -0,0 +1,159 @@
+"""基于 httpx 的原生 asyncio 飞书多维表格客户端。
+
+与 lark-oapi SDK 不同，所有请求都直接在事件循环中发出，复用同一个 keep-alive 连接池，
+tenant_access_token 也在协程中异步获取和刷新，不再占用线程池。
+
+返回值 BitableResponse 提供与 SDK 响应相同的 success() / code / msg / get_log_id() / data 接口，
+因此可以直接作为 FeishuBitableManager 的后端使用。
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import httpx
+
+from .response import BATCH_LIMIT, FEISHU_BASE_URL, TOKEN_INVALID_CODES, BitableResponse, records_path
+from .stats import RequestStats, endpoint_name
+
+
+class AsyncBitableClient:
+    """飞书多维表格异步客户端，支持 list / search / batch_create / batch_update / batch_delete。"""
+    def __init__(self, app_id: str, app_secret: str, base_url: str = FEISHU_BASE_URL, max_connections: int = 10, timeout: float = 60,
+                 stats: Optional[RequestStats] = None):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.stats = stats or RequestStats()
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _get_tenant_access_token(self, force_refresh: bool = False) -> str:
+        async with self._token_lock:
+            if not force_refresh and self._token and time.time() < self._token_expires_at:
+                return self._token
+            path = "/open-apis/auth/v3/tenant_access_token/internal"
+            start = time.perf_counter()
+            resp = await self._http.post(path, json={"app_id": self.app_id, "app_secret": self.app_secret})
+            data = resp.json() if resp.status_code == 200 else {}
+            self.stats.record(endpoint_name("POST", path), time.perf_counter() - start, data.get("code") == 0)
+            resp.raise_for_status()
+            if data.get("code") != 0:
+                raise Exception(f"获取飞书Token失败: {data.get('msg')}")
+            self._token = data["tenant_access_token"]
+            self._token_expires_at = time.time() + data.get("expire", 7200) - 300
+            return self._token
+
+    async def _request(self, method: str, path: str, params: Optional[Dict] = None, body: Optional[Dict] = None) -> BitableResponse:
+        """发出请求并转换为 BitableResponse；网络或解析错误以 code=-1 的失败响应返回，不抛出异常。"""
+        endpoint = endpoint_name(method, path)
+        for attempt in range(2):
+            start = time.perf_counter()
+            try:
+                token = await self._get_tenant_access_token(force_refresh=attempt > 0)
+                start = time.perf_counter()
+                resp = await self._http.request(method, path, params=params, json=body,
+                                                headers={"Authorization": f"Bearer {token}"})
+                log_id = resp.headers.get("X-Tt-Logid", "")
+                try:
+                    result = resp.json()
+                except ValueError:
+                    self.stats.record(endpoint, time.perf_counter() - start, ok=False)
+                    return BitableResponse(-1, f"HTTP {resp.status_code}: {resp.text[:200]}", log_id=log_id)
+            except Exception as e:
+                self.stats.record(endpoint, time.perf_counter() - start, ok=False)
+                return BitableResponse(-1, f"{type(e).__name__}: {e}")
+            code = result.get("code", -1)
+            self.stats.record(endpoint, time.perf_counter() - start, ok=code == 0)
+            if code in TOKEN_INVALID_CODES and attempt == 0:
+                continue
+            return BitableResponse(code, result.get("msg", ""), result.get("data"), log_id)
+
+    async def list_tables(self, app_token: str) -> BitableResponse:
+        return await self._request("GET", f"/open-apis/bitable/v1/apps/{app_token}/tables")
+
+    async def list_records(self, app_token: str, table_id: str, page_size: int = 500, page_token: Optional[str] = None,
+                           field_names: Optional[List[str]] = None) -> BitableResponse:
+        params = {"page_size": page_size}
+        if page_token: params["page_token"] = page_token
+        if field_names: params["field_names"] = json.dumps(field_names, ensure_ascii=False)
+        return await self._request("GET", records_path(app_token, table_id), params=params)
+
+    async def search_records(self, app_token: str, table_id: str, body: Optional[Dict] = None, page_size: int = 500,
+                             page_token: Optional[str] = None) -> BitableResponse:
+        params = {"page_size": page_size}
+        if page_token: params["page_token"] = page_token
+        return await self._request("POST", records_path(app_token, table_id, "search"), params=params, body=body or {})
+
+    async def iter_records(self, app_token: str, table_id: str, field_names: Optional[List[str]] = None, filter: Optional[Dict] = None,
+                           use_search: bool = False, page_size: int = 500) -> AsyncIterator:
+        """逐条产出表格记录。处理第 N 页时第 N+1 页的请求已经在途，任一页失败时抛出 BitableError。
+
+        传入 filter 或 use_search=True 时使用 search 接口，否则使用 list 接口。
+        """
+        if filter is not None or use_search:
+            body = {k: v for k, v in (("field_names", field_names), ("filter", filter)) if v}
+            fetch = lambda token: self.search_records(app_token, table_id, body, page_size, token)
+        else:
+            fetch = lambda token: self.list_records(app_token, table_id, page_size, token, field_names)
+        task = asyncio.ensure_future(fetch(None))
+        try:
+            while task:
+                resp = (await task).raise_for_error()
+                task = asyncio.ensure_future(fetch(resp.data.page_token)) if resp.data.has_more else None
+                for item in resp.data.items or []:
+                    yield item
+        finally:
+            if task and not task.done(): task.cancel()
+
+    async def batch_create(self, app_token: str, table_id: str, records: List[Dict], client_token: Optional[str] = None) -> BitableResponse:
+        """records 为字段字典列表，例如 [{"门店名称": "xx"}]，单次最多 500 条。
+
+        client_token (uuid4) 为幂等键：重发同一批记录时使用同一个 client_token，飞书不会重复新增。
+        """
+        body = {"records": [{"fields": fields} for fields in records]}
+        params = {"client_token": client_token} if client_token else None
+        return await self._request("POST", records_path(app_token, table_id, "batch_create"), params=params, body=body)
+
+    async def batch_update(self, app_token: str, table_id: str, records: List[Dict]) -> BitableResponse:
+        """records 为 [{"record_id": "...", "fields": {...}}] 形式。"""
+        return await self._request("POST", records_path(app_token, table_id, "batch_update"), body={"records": records})
+
+    async def batch_delete(self, app_token: str, table_id: str, record_ids: List[str]) -> BitableResponse:
+        return await self._request("POST", records_path(app_token, table_id, "batch_delete"), body={"records": record_ids})
+
+    async def _run_batches(self, send, items: Iterable) -> List[BitableResponse]:
+        semaphore = asyncio.Semaphore(self.max_connections)
+
+        async def run(chunk):
+            async with semaphore:
+                return await send(chunk)
+
+        iterator = iter(items)
+        chunks = iter(lambda: list(itertools.islice(iterator, BATCH_LIMIT)), [])
+        return list(await asyncio.gather(*(run(chunk) for chunk in chunks)))
+
+    async def create_records(self, app_token: str, table_id: str, records: Iterable[Dict]) -> List[BitableResponse]:
+        """按 500 条自动分块并发新增，返回每个分块的响应 (按分块顺序)。"""
+        return await self._run_batches(lambda chunk: self.batch_create(app_token, table_id, chunk), records)
+
+    async def delete_records(self, app_token: str, table_id: str, record_ids: Iterable[str]) -> List[BitableResponse]:
+        """按 500 条自动分块并发删除，返回每个分块的响应 (按分块顺序)。"""
+        return await self._run_batches(lambda chunk: self.batch_delete(app_token, table_id, chunk), record_ids)
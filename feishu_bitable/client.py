@@ -0,0 +1,159 @@
+"""基于 requests.Session 的同步飞书多维表格客户端，可在多个线程间共享。
+
+- tenant_access_token 缓存到过期前 5 分钟，多个线程同时刷新时只请求一次；
+- 所有请求复用同一个连接池；
+- iter_records 在处理当前页时已经在后台请求下一页；
+- create_records / delete_records 按 500 条自动分块。
+"""
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .response import BATCH_LIMIT, FEISHU_BASE_URL, TOKEN_INVALID_CODES, BitableError, BitableResponse, records_path
+from .stats import RequestStats, endpoint_name
+
+
+class BitableClient:
+    """飞书多维表格同步客户端。方法返回 BitableResponse (失败时 success() 为 False，不抛出异常)，
+    只有 iter_records / get_first_table_id 这类无法返回部分结果的方法在失败时抛出 BitableError。
+    """
+    def __init__(self, app_id: str, app_secret: str, base_url: str = FEISHU_BASE_URL, pool_size: int = 10, timeout: float = 60,
+                 stats: Optional[RequestStats] = None):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.stats = stats or RequestStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _get_tenant_access_token(self, force_refresh: bool = False) -> str:
+        with self._token_lock:
+            if not force_refresh and self._token and time.time() < self._token_expires_at:
+                return self._token
+            path = "/open-apis/auth/v3/tenant_access_token/internal"
+            start = time.perf_counter()
+            response = self.session.post(self.base_url + path, json={"app_id": self.app_id, "app_secret": self.app_secret}, timeout=self.timeout)
+            data = response.json() if response.status_code == 200 else {}
+            self.stats.record(endpoint_name("POST", path), time.perf_counter() - start, data.get("code") == 0)
+            response.raise_for_status()
+            if data.get("code") != 0:
+                raise Exception(f"获取飞书Token失败: {data.get('msg')}")
+            self._token = data["tenant_access_token"]
+            self._token_expires_at = time.time() + data.get("expire", 7200) - 300
+            return self._token
+
+    def _request(self, method: str, path: str, params: Optional[Dict] = None, body: Optional[Dict] = None,
+                 timeout: Optional[float] = None) -> BitableResponse:
+        """发出请求并转换为 BitableResponse；网络或解析错误以 code=-1 的失败响应返回，不抛出异常。"""
+        endpoint = endpoint_name(method, path)
+        for attempt in range(2):
+            start = time.perf_counter()
+            try:
+                token = self._get_tenant_access_token(force_refresh=attempt > 0)
+                start = time.perf_counter()
+                response = self.session.request(method, self.base_url + path, params=params, json=body,
+                                                headers={"Authorization": f"Bearer {token}"}, timeout=timeout or self.timeout)
+                log_id = response.headers.get("X-Tt-Logid", "")
+                try:
+                    result = response.json()
+                except ValueError:
+                    self.stats.record(endpoint, time.perf_counter() - start, ok=False)
+                    return BitableResponse(-1, f"HTTP {response.status_code}: {response.text[:200]}", log_id=log_id)
+            except Exception as e:
+                self.stats.record(endpoint, time.perf_counter() - start, ok=False)
+                return BitableResponse(-1, f"{type(e).__name__}: {e}")
+            code = result.get("code", -1)
+            self.stats.record(endpoint, time.perf_counter() - start, ok=code == 0)
+            if code in TOKEN_INVALID_CODES and attempt == 0:
+                continue
+            return BitableResponse(code, result.get("msg", ""), result.get("data"), log_id)
+
+    def list_tables(self, app_token: str) -> BitableResponse:
+        return self._request("GET", f"/open-apis/bitable/v1/apps/{app_token}/tables")
+
+    def get_first_table_id(self, app_token: str) -> str:
+        resp = self.list_tables(app_token)
+        if not resp.success() or not resp.raw_data.get("items"):
+            raise BitableError(resp.code, f"获取飞书数据表ID失败: {resp.msg}", resp.get_log_id())
+        return resp.raw_data["items"][0]["table_id"]
+
+    def list_records(self, app_token: str, table_id: str, page_size: int = 500, page_token: Optional[str] = None,
+                     field_names: Optional[List[str]] = None) -> BitableResponse:
+        params = {"page_size": page_size}
+        if page_token: params["page_token"] = page_token
+        if field_names: params["field_names"] = json.dumps(field_names, ensure_ascii=False)
+        return self._request("GET", records_path(app_token, table_id), params=params)
+
+    def search_records(self, app_token: str, table_id: str, body: Optional[Dict] = None, page_size: int = 500,
+                       page_token: Optional[str] = None) -> BitableResponse:
+        params = {"page_size": page_size}
+        if page_token: params["page_token"] = page_token
+        return self._request("POST", records_path(app_token, table_id, "search"), params=params, body=body or {})
+
+    def iter_records(self, app_token: str, table_id: str, field_names: Optional[List[str]] = None, filter: Optional[Dict] = None,
+                     use_search: bool = False, page_size: int = 500) -> Iterator:
+        """逐条产出表格记录 (带 record_id、fields 属性)。处理第 N 页时第 N+1 页已在后台线程中请求，
+        任一页失败时抛出 BitableError。传入 filter 或 use_search=True 时使用 search 接口，否则使用 list 接口。
+        """
+        if filter is not None or use_search:
+            body = {k: v for k, v in (("field_names", field_names), ("filter", filter)) if v}
+            fetch = lambda token: self.search_records(app_token, table_id, body, page_size, token)
+        else:
+            fetch = lambda token: self.list_records(app_token, table_id, page_size, token, field_names)
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            future = prefetcher.submit(fetch, None)
+            while future:
+                resp = future.result().raise_for_error()
+                future = prefetcher.submit(fetch, resp.data.page_token) if resp.data.has_more else None
+                yield from resp.data.items or []
+
+    def batch_create(self, app_token: str, table_id: str, records: List[Dict], client_token: Optional[str] = None) -> BitableResponse:
+        """records 为字段字典列表，例如 [{"商品ID": "xx"}]，单次最多 500 条。
+
+        client_token (uuid4) 为幂等键：重发同一批记录时使用同一个 client_token，飞书不会重复新增。
+        """
+        body = {"records": [{"fields": fields} for fields in records]}
+        params = {"client_token": client_token} if client_token else None
+        return self._request("POST", records_path(app_token, table_id, "batch_create"), params=params, body=body,
+                             timeout=max(self.timeout, 120))
+
+    def batch_update(self, app_token: str, table_id: str, records: List[Dict]) -> BitableResponse:
+        """records 为 [{"record_id": "...", "fields": {...}}] 形式。"""
+        return self._request("POST", records_path(app_token, table_id, "batch_update"), body={"records": records})
+
+    def batch_delete(self, app_token: str, table_id: str, record_ids: List[str]) -> BitableResponse:
+        return self._request("POST", records_path(app_token, table_id, "batch_delete"), body={"records": record_ids})
+
+    @staticmethod
+    def _chunks(items: Iterable) -> Iterator[List]:
+        iterator = iter(items)
+        return iter(lambda: list(itertools.islice(iterator, BATCH_LIMIT)), [])
+
+    def create_records(self, app_token: str, table_id: str, records: Iterable[Dict]) -> List[BitableResponse]:
+        """按 500 条自动分块依次新增，返回每个分块的响应。"""
+        return [self.batch_create(app_token, table_id, chunk) for chunk in self._chunks(records)]
+
+    def delete_records(self, app_token: str, table_id: str, record_ids: Iterable[str]) -> List[BitableResponse]:
+        """按 500 条自动分块依次删除，返回每个分块的响应。"""
+        return [self.batch_delete(app_token, table_id, chunk) for chunk in self._chunks(record_ids)]
@@ -0,0 +1,61 @@
+"""同步和异步客户端共用的响应对象、异常与工具函数。"""
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+FEISHU_BASE_URL = "https://open.feishu.cn"
+# 多维表格批量新增/更新/删除接口单次最多 500 条
+BATCH_LIMIT = 500
+# 这些错误码表示 token 已失效，需要刷新后重试一次
+TOKEN_INVALID_CODES = {99991661, 99991663, 99991668}
+
+
+class BitableError(Exception):
+    def __init__(self, code: int, msg: str, log_id: str = ""):
+        super().__init__(f"飞书接口错误 {code}: {msg}" + (f" (log_id: {log_id})" if log_id else ""))
+        self.code = code
+        self.msg = msg
+        self.log_id = log_id
+
+
+class BitableResponse:
+    """模仿 lark-oapi 响应对象的最小接口。data 中的 items/records 为带 record_id、fields 属性的对象。"""
+    def __init__(self, code: int, msg: str, data: Optional[Dict] = None, log_id: str = ""):
+        self.code = code
+        self.msg = msg
+        self.raw_data = data or {}
+        self.data = self._wrap(self.raw_data)
+        self._log_id = log_id
+
+    @staticmethod
+    def _wrap(data: Dict) -> SimpleNamespace:
+        wrapped = dict(data)
+        for key in ("items", "records"):
+            if isinstance(data.get(key), list):
+                wrapped[key] = [SimpleNamespace(record_id=r.get("record_id"), fields=r.get("fields") or {}) if isinstance(r, dict) else r
+                                for r in data[key]]
+        wrapped.setdefault("items", None)
+        wrapped.setdefault("has_more", False)
+        wrapped.setdefault("page_token", None)
+        return SimpleNamespace(**wrapped)
+
+    def success(self) -> bool:
+        return self.code == 0
+
+    def get_log_id(self) -> str:
+        return self._log_id
+
+    def raise_for_error(self) -> "BitableResponse":
+        if not self.success():
+            raise BitableError(self.code, self.msg, self._log_id)
+        return self
+
+
+def records_path(app_token: str, table_id: str, action: str = "") -> str:
+    return f"/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records" + (f"/{action}" if action else "")
+
+
+def field_text(value) -> str:
+    """文本字段可能是字符串，也可能是富文本片段列表 ([{"text": ..., "type": "text"}])，统一转成去空白的字符串。"""
+    if isinstance(value, list):
+        return "".join(seg.get("text", "") for seg in value if isinstance(seg, dict)).strip()
+    return str(value).strip() if value is not None else ""
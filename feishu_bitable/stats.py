@@ -0,0 +1,42 @@
+"""飞书接口请求计数与耗时统计，同步和异步客户端共用。"""
+import re
+import threading
+from collections import Counter, defaultdict
+
+# 把路径中的 app_token / table_id 换成占位符，同一接口的请求归到一起统计
+_ID_SEGMENTS = re.compile(r"/(apps|tables)/[^/]+")
+
+
+def endpoint_name(method: str, path: str) -> str:
+    path = path.split("/open-apis/", 1)[-1]
+    return f"{method} {_ID_SEGMENTS.sub(lambda m: f'/{m.group(1)}/:id', path).rstrip('/')}"
+
+
+class RequestStats:
+    """按接口统计请求次数、失败次数、累计与最大耗时。线程安全。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.total_seconds = defaultdict(float)
+        self.max_seconds = defaultdict(float)
+
+    def record(self, endpoint: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self.calls[endpoint] += 1
+            if not ok: self.errors[endpoint] += 1
+            self.total_seconds[endpoint] += seconds
+            self.max_seconds[endpoint] = max(self.max_seconds[endpoint], seconds)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.calls.values())
+
+    def summary(self) -> str:
+        with self._lock:
+            lines = [f"飞书接口请求统计: 共 {self.total_requests} 次"]
+            for endpoint, count in self.calls.most_common():
+                avg_ms = self.total_seconds[endpoint] / count * 1000
+                lines.append(f"  {endpoint}: {count} 次, 失败 {self.errors[endpoint]} 次, "
+                             f"平均 {avg_ms:.0f} ms, 最大 {self.max_seconds[endpoint] * 1000:.0f} ms")
+        return "\n".join(lines)
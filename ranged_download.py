@@ -0,0 +1,281 @@
+"""支持断点续传和分段并发的 HTTP 下载。
+
+- iter_ranged() 按顺序产出 URL 的内容。第一个请求只要第一段 (Range: bytes=start-...)，返回 206 即说明服务器支持 Range，
+  同时得到文件总大小：剩余部分较大时切成 part_size 的分段，由多个线程并发下载、按顺序产出；传输中断时从已收到的位置重新请求。
+  服务器忽略 Range (返回 200) 时退回到单个流，中断后从头重新请求并跳过已产出的部分。
+- download_file() 把 URL 下载到 dest_path，未完成的数据保存在 dest_path + ".part"，下次调用时从该位置继续。
+  服务器返回的 ETag、Last-Modified 和文件总大小记录在 dest_path + ".part.json"，续传时用 If-Range 请求并核对总大小，
+  服务器上的文件已经变化时丢弃旧的部分数据从头下载，不会把两个版本的内容拼在一起。
+
+失败时抛出的 DownloadError 是 requests.exceptions.RequestException 的子类，调用方可以和网络错误一样处理。
+"""
+import hashlib
+import itertools
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RANGE_PART_SIZE = int(float(os.getenv("DOWNLOAD_RANGE_PART_MB", "2")) * 1024 * 1024)
+# 同时在途的分段数；剩余数据小于 RANGE_PARALLEL_MIN_BYTES 时不分段，沿用单个 Range 流
+RANGE_PARALLEL = int(os.getenv("DOWNLOAD_RANGE_PARALLEL", "4"))
+RANGE_PARALLEL_MIN_BYTES = int(float(os.getenv("DOWNLOAD_RANGE_MIN_MB", "8")) * 1024 * 1024)
+# 每个流或分段在放弃前允许的重试次数
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+# 超过这个时间没有继续的 .part 文件由 remove_stale_parts() 清理
+DOWNLOAD_PART_TTL_HOURS = float(os.getenv("DOWNLOAD_PART_TTL_HOURS", "24"))
+CHUNK_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_UNSATISFIED_RANGE = re.compile(r"bytes \*/(\d+)")
+
+
+class DownloadError(requests.exceptions.RequestException):
+    pass
+
+
+class RangeNotSatisfiable(DownloadError):
+    """续传位置超出了服务器上文件的大小，已有的部分数据与当前文件不一致。"""
+
+
+class ResumeMismatch(DownloadError):
+    """服务器上的文件与已下载的部分数据不是同一个版本 (ETag 或总大小变化，或 If-Range 不成立时返回了整个文件)。"""
+
+
+def _new_session(parallel: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(parallel, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get(session, url, headers, start, end, timeout, if_range=None):
+    range_headers = dict(headers or {})
+    range_headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    if if_range: range_headers["If-Range"] = if_range
+    return session.get(url, headers=range_headers, stream=True, timeout=timeout)
+
+
+def _if_range(validators: Dict) -> Optional[str]:
+    """If-Range 只接受强 ETag，弱 ETag 时改用 Last-Modified。"""
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"): return etag
+    return validators.get("last_modified")
+
+
+def _check_resume(validators: Dict, etag: Optional[str], total: Optional[int]):
+    if validators.get("total") is not None and total != validators["total"]:
+        raise ResumeMismatch(f"文件总大小由 {validators['total']} 变为 {total}")
+    if validators.get("etag") and etag and etag != validators["etag"]:
+        raise ResumeMismatch(f"ETag 由 {validators['etag']} 变为 {etag}")
+
+
+def _fetch_part(session, url, headers, start, end, retries, timeout) -> bytes:
+    for attempt in range(retries + 1):
+        try:
+            with _get(session, url, headers, start, end, timeout) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise DownloadError(f"分段 {start}-{end} 返回 HTTP {r.status_code}，服务器未按 Range 响应")
+                data = r.content
+            if len(data) != end - start + 1:
+                raise DownloadError(f"分段 {start}-{end} 只收到 {len(data)} 字节")
+            return data
+        except requests.exceptions.RequestException:
+            if attempt == retries: raise
+
+
+def _iter_sequential(session, url, headers, offset, end, retries, timeout, response=None) -> Iterator[bytes]:
+    """用 Range 请求顺序产出 [offset, end] (end 为 None 时到文件末尾)，中断后从已收到的位置继续。"""
+    failures = 0
+    while end is None or offset <= end:
+        try:
+            r = response if response is not None else _get(session, url, headers, offset, end, timeout)
+            response = None
+            with r:
+                if r.status_code == 416 and end is None: return
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise DownloadError(f"续传请求返回 HTTP {r.status_code}，服务器未按 Range 响应")
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if end is not None: chunk = chunk[:end - offset + 1]
+                    offset += len(chunk)
+                    yield chunk
+            if end is None: return
+            if offset <= end: raise DownloadError(f"连接在第 {offset} 字节提前结束")
+        except requests.exceptions.RequestException:
+            failures += 1
+            if failures > retries: raise
+
+
+def _iter_parallel(session, url, headers, offset, total, part_size, parallel, retries, timeout) -> Iterator[bytes]:
+    """把 [offset, total) 切成分段并发下载，最多 parallel 个分段在途，按顺序产出。"""
+    parts = ((start, min(start + part_size, total) - 1) for start in range(offset, total, part_size))
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="range") as pool:
+        pending = deque(pool.submit(_fetch_part, session, url, headers, start, end, retries, timeout)
+                        for start, end in itertools.islice(parts, parallel))
+        try:
+            while pending:
+                data = pending.popleft().result()
+                for start, end in itertools.islice(parts, 1):
+                    pending.append(pool.submit(_fetch_part, session, url, headers, start, end, retries, timeout))
+                yield data
+        finally:
+            for future in pending: future.cancel()
+
+
+def _iter_unranged(session, url, headers, delivered, retries, timeout, response) -> Iterator[bytes]:
+    """服务器不支持 Range 时的单个流：跳过前 delivered 字节，中断后从头重新请求并跳过已产出的部分。"""
+    failures = 0
+    while True:
+        try:
+            r = response if response is not None else session.get(url, headers=headers, stream=True, timeout=timeout)
+            response = None
+            with r:
+                r.raise_for_status()
+                position = 0
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    chunk_start, position = position, position + len(chunk)
+                    if position <= delivered: continue
+                    chunk = chunk[max(0, delivered - chunk_start):]
+                    delivered = position
+                    yield chunk
+            return
+        except requests.exceptions.RequestException:
+            failures += 1
+            if failures > retries: raise
+
+
+def iter_ranged(url: str, headers: Optional[Dict] = None, start: int = 0, session: Optional[requests.Session] = None,
+                part_size: int = RANGE_PART_SIZE, parallel: int = RANGE_PARALLEL, min_parallel_bytes: int = RANGE_PARALLEL_MIN_BYTES,
+                retries: int = DOWNLOAD_RETRIES, timeout: float = 180, validators: Optional[Dict] = None,
+                info: Optional[Dict] = None) -> Iterator[bytes]:
+    """按顺序产出 URL 从 start 字节开始的全部内容。
+
+    validators 为之前下载时记录的 {"etag", "last_modified", "total"}：续传请求带上 If-Range，
+    服务器返回整个文件 (内容已变化) 或 ETag、总大小与记录不一致时抛出 ResumeMismatch。
+    传入 info 字典时，在产出第一块数据之前写入第一个响应的 etag、last_modified 和 total (未知时为 None)。
+    """
+    own_session = session is None
+    session = session or _new_session(parallel)
+    validators = validators or {}
+    try:
+        for attempt in range(retries + 1):
+            try:
+                first = _get(session, url, headers, start, start + part_size - 1, timeout,
+                             if_range=_if_range(validators) if start > 0 else None)
+                break
+            except requests.exceptions.RequestException:
+                if attempt == retries: raise
+        etag, last_modified = first.headers.get("ETag"), first.headers.get("Last-Modified")
+        if first.status_code == 416 and start > 0:
+            first.close()
+            match = _UNSATISFIED_RANGE.match(first.headers.get("Content-Range", ""))
+            if match and int(match.group(1)) == start:
+                _check_resume(validators, etag, start)
+                return  # 之前已经下载完整
+            raise RangeNotSatisfiable(f"续传位置 {start} 超出文件大小 ({first.headers.get('Content-Range', '未知')})")
+        match = _CONTENT_RANGE.match(first.headers.get("Content-Range", ""))
+        if first.status_code != 206 or not match:
+            if start > 0 and first.status_code == 200:
+                # 带 If-Range 时 200 表示文件已经变化；服务器不支持 Range 时也无法确认已有数据属于同一个版本
+                first.close()
+                raise ResumeMismatch(f"续传请求返回了整个文件 (HTTP 200)，无法从第 {start} 字节继续")
+            length = first.headers.get("Content-Length")
+            if info is not None:
+                info.update(etag=etag, last_modified=last_modified, total=int(length) if first.ok and length and length.isdigit() else None)
+            yield from _iter_unranged(session, url, headers, start, retries, timeout, first)
+            return
+        first_end = int(match.group(2))
+        total = int(match.group(3)) if match.group(3) != "*" else None
+        if start > 0:
+            try:
+                _check_resume(validators, etag, total)
+            except ResumeMismatch:
+                first.close(); raise
+        if info is not None: info.update(etag=etag, last_modified=last_modified, total=total)
+        yield from _iter_sequential(session, url, headers, start, first_end, retries, timeout, first)
+        offset = first_end + 1
+        if total is None:
+            yield from _iter_sequential(session, url, headers, offset, None, retries, timeout)
+        elif parallel > 1 and total - offset >= min_parallel_bytes:
+            yield from _iter_parallel(session, url, headers, offset, total, part_size, parallel, retries, timeout)
+        elif offset < total:
+            yield from _iter_sequential(session, url, headers, offset, total - 1, retries, timeout)
+    finally:
+        if own_session: session.close()
+
+
+def _read_validators(meta_path: str) -> Optional[Dict]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f: validators = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # 没有记录总大小的部分数据无法核对，不续传
+    return validators if isinstance(validators, dict) and validators.get("total") is not None else None
+
+
+def _write_validators(meta_path: str, info: Dict):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({key: info.get(key) for key in ("etag", "last_modified", "total")}, f)
+    os.replace(tmp_path, meta_path)
+
+
+def discard_partial(dest_path: str):
+    """删除 dest_path 未完成的部分数据和对应的 .part.json。"""
+    for path in (dest_path + ".part", dest_path + ".part.json"):
+        if os.path.exists(path): os.remove(path)
+
+
+def remove_stale_parts(directory: str, max_age_hours: float = DOWNLOAD_PART_TTL_HOURS) -> int:
+    """删除 directory 中超过 max_age_hours 没有更新的 .part 及 .part.json 文件 (一直下载失败的视频留下的)，返回删除的文件数。"""
+    if not os.path.isdir(directory): return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith((".part", ".part.json")) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def download_file(url: str, dest_path: str, headers: Optional[Dict] = None, hash_name: Optional[str] = None,
+                  **kwargs) -> Tuple[int, Optional[str]]:
+    """把 URL 下载到 dest_path，返回 (文件大小, 内容哈希)。未完成的数据留在 dest_path + ".part"，下次调用时从该位置继续。
+
+    续传前用 .part.json 中记录的 ETag/Last-Modified 和总大小确认服务器上仍是同一个文件，不一致时丢弃部分数据从头下载。
+    hash_name 为 hashlib 算法名 (如 "sha256") 时，边下载边计算整个文件 (含之前已下载部分) 的哈希，否则哈希为 None。
+    """
+    part_path, meta_path = dest_path + ".part", dest_path + ".part.json"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validators = _read_validators(meta_path) if offset else None
+    if offset and validators is None:
+        discard_partial(dest_path)
+        offset = 0
+    digest = hashlib.new(hash_name) if hash_name else None
+    if offset and digest is not None:
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""): digest.update(block)
+    info = {}
+    try:
+        with open(part_path, "ab") as f:
+            for chunk in iter_ranged(url, headers, start=offset, validators=validators, info=info, **kwargs):
+                if not offset and not f.tell(): _write_validators(meta_path, info)
+                f.write(chunk)
+                if digest is not None: digest.update(chunk)
+    except (RangeNotSatisfiable, ResumeMismatch):
+        # 旧的部分数据与服务器上的文件对不上，丢弃后从头下载
+        discard_partial(dest_path)
+        return download_file(url, dest_path, headers, hash_name, **kwargs)
+    os.replace(part_path, dest_path)
+    if os.path.exists(meta_path): os.remove(meta_path)
+    return os.path.getsize(dest_path), digest.hexdigest() if digest is not None else None
@@ -1,200 +1,468 @@
-import requests
-import time
-import json
-import lark_oapi as lark
-from lark_oapi.api.bitable.v1 import *
-from lark_oapi.api.auth.v3 import *
-import os
-
-# =================================================================
-# 1. 配置信息
-# =================================================================
-
-# --- 从环境变量读取密钥 (Secrets) ---
-# 使用专属的、清晰的变量名
-DOUYIN_APP_ID = os.getenv("DOUYIN_APP_ID")
-DOUYIN_APP_SECRET = os.getenv("DOUYIN_APP_SECRET")
-FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
-FEISHU_APP_SECRET = os.getenv("FEISHU_APP_SECRET")
-
-# --- 直接硬编码的任务相关ID ---
-DOUYIN_ACCOUNT_ID = "7241078611527075855"
-FEISHU_BITABLE_APP_TOKEN = "MslRbdwPca7P6qsqbqgcvpBGnRh"
-FEISHU_BITABLE_TABLE_ID = "tbl6jUYvV6TXXOZ2"
-TARGET_FIELD_NAME = "商品ID"
-
-# =================================================================
-# 2. API 调用函数
-# (这部分核心逻辑无变化)
-# =================================================================
-
-def get_douyin_token():
-    """获取抖音 access-token (带详细错误日志)"""
-    print(">>> 正在获取抖音 access-token...")
-    if not DOUYIN_APP_ID or not DOUYIN_APP_SECRET:
-        print("    -> 错误: 抖音的 DOUYIN_APP_ID 或 DOUYIN_APP_SECRET 环境变量未设置！请检查GitHub Actions的Secrets配置。")
-        return None
-        
-    url = "https://open.douyin.com/oauth/client_token/"
-    payload = {"grant_type": "client_credential", "client_key": DOUYIN_APP_ID, "client_secret": DOUYIN_APP_SECRET}
-    try:
-        response = requests.post(url, headers={'Content-Type': 'application/json'}, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("data", {}).get("error_code") == 0:
-            print("    -> 抖音 access-token 获取成功！")
-            return data["data"]["access_token"]
-        else:
-            print(f"    -> 抖音 API 返回业务错误: {data}")
-            return None
-    except requests.exceptions.Timeout:
-        print("    -> 抖音 access-token 获取失败: 请求超时 (Timeout)。")
-    except requests.exceptions.RequestException as e:
-        print(f"    -> 抖音 access-token 获取失败: 发生网络请求错误。")
-        print(f"       具体异常 (Exception): {e}")
-    except Exception as e:
-        print(f"    -> 抖音 access-token 获取失败: 发生未知错误。")
-        print(f"       具体异常 (Exception): {e}")
-    return None
-
-def get_douyin_poi_list(douyin_token, account_id):
-    print("\n>>> 正在从抖音获取所有门店POI列表...")
-    poi_ids = []
-    page = 1
-    poi_url = "https://open.douyin.com/goodlife/v1/shop/poi/query/"
-    while True:
-        params = {'account_id': account_id, 'page': page, 'size': 50}
-        try:
-            response = requests.get(poi_url, headers={'Content-Type': 'application/json', 'access-token': douyin_token}, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            if data.get("data", {}).get("error_code") == 0:
-                pois = data["data"].get("pois", [])
-                if not pois: break
-                poi_ids.extend([p.get("poi", {}).get("poi_id") for p in pois if p.get("poi", {}).get("poi_id")])
-                if len(pois) < 50: break
-                page += 1
-            else: return []
-        except Exception: return []
-    print(f"    -> 成功获取到 {len(poi_ids)} 个门店ID。")
-    return poi_ids
-
-def get_products_for_single_poi(douyin_token, account_id, poi_id):
-    product_ids = set()
-    cursor = None
-    product_url = "https://open.douyin.com/goodlife/v1/goods/product/online/query/"
-    while True:
-        params = {'account_id': account_id, 'poi_ids': [poi_id], 'count': 50}
-        if cursor: params['cursor'] = cursor
-        try:
-            response = requests.get(product_url, headers={'content-type': 'application/json', 'access-token': douyin_token}, params=params, timeout=30)
-            data = response.json()
-            if data.get("data", {}).get("error_code") == 0:
-                products = data["data"].get("products", [])
-                for p in products:
-                    prod_info = p.get("product", {})
-                    if prod_info.get("product_id"):
-                        product_ids.add(prod_info["product_id"])
-                if data["data"].get("has_more"):
-                    cursor = data["data"].get("next_cursor")
-                else: break
-            else: break
-        except Exception: break
-    return product_ids
-
-def get_all_feishu_product_ids(feishu_client, app_token, table_id, field_name):
-    print(f"\n>>> 正在从飞书多维表格 '{table_id}' 获取已有的 '{field_name}' 作为基准数据...")
-    existing_ids = set()
-    page_token = None
-    while True:
-        req_builder = SearchAppTableRecordRequest.builder() \
-            .app_token(app_token).table_id(table_id).page_size(500) \
-            .request_body(SearchAppTableRecordRequestBody.builder().field_names([field_name]).build())
-        if page_token:
-            req_builder.page_token(page_token)
-        request = req_builder.build()
-        try:
-            response = feishu_client.bitable.v1.app_table_record.search(request)
-            if not response.success():
-                raise Exception(f"查询飞书记录失败, code: {response.code}, msg: {response.msg}")
-            items = response.data.items or []
-            for item in items:
-                field_data_list = item.fields.get(field_name)
-                if isinstance(field_data_list, list) and field_data_list:
-                    text_value = field_data_list[0].get('text')
-                    if text_value:
-                        existing_ids.add(text_value)
-            if response.data.has_more:
-                page_token = response.data.page_token
-            else: break
-        except Exception as e:
-            print(f"    -> 查询飞书记录时发生异常: {e}")
-            break
-    print(f"    -> 基准数据获取完毕，飞书侧现有 {len(existing_ids)} 个ID。")
-    return existing_ids
-
-def add_records_to_feishu(feishu_client, app_token, table_id, field_name, new_ids_chunk):
-    if not new_ids_chunk: return True
-    print(f"    -> 正在向飞书写入 {len(new_ids_chunk)} 条新记录...")
-    records_to_create = [AppTableRecord.builder().fields({field_name: new_id}).build() for new_id in new_ids_chunk]
-    request = BatchCreateAppTableRecordRequest.builder() \
-        .app_token(app_token).table_id(table_id).request_body(BatchCreateAppTableRecordRequestBody.builder().records(records_to_create).build()).build()
-    try:
-        response = feishu_client.bitable.v1.app_table_record.batch_create(request)
-        if not response.success():
-            print(f"    -> 批次写入失败, code: {response.code}, msg: {response.msg}")
-            return False
-        else:
-            print(f"    -> 批次写入成功！")
-            return True
-    except Exception as e:
-        print(f"    -> 批次写入时发生异常: {e}")
-        return False
-
-def main():
-    douyin_token = get_douyin_token()
-    if not douyin_token:
-        print("\n获取抖音Token失败，任务中止。")
-        return
-        
-    print("\n>>> 正在初始化飞书客户端 (SDK将自动管理Token)...")
-    feishu_client = lark.Client.builder() \
-        .app_id(FEISHU_APP_ID) \
-        .app_secret(FEISHU_APP_SECRET) \
-        .log_level(lark.LogLevel.INFO) \
-        .build()
-    print("    -> 飞书客户端初始化成功！")
-
-    existing_feishu_ids = get_all_feishu_product_ids(feishu_client, FEISHU_BITABLE_APP_TOKEN, FEISHU_BITABLE_TABLE_ID, TARGET_FIELD_NAME)
-    all_poi_ids = get_douyin_poi_list(douyin_token, DOUYIN_ACCOUNT_ID)
-    
-    print(f"\n>>> [正式运行] 开始处理全部 {len(all_poi_ids)} 家门店的数据...")
-    print("="*60)
-    
-    total_new_ids_written = 0
-    for i, poi_id in enumerate(all_poi_ids):
-        print(f"-> 正在处理第 {i+1}/{len(all_poi_ids)} 个门店 (POI ID: {poi_id})")
-        
-        douyin_ids_for_this_poi = get_products_for_single_poi(douyin_token, DOUYIN_ACCOUNT_ID, poi_id)
-        if not douyin_ids_for_this_poi:
-            print("    -> 未找到商品或查询失败，跳过。")
-            continue
-        
-        new_ids_to_add = douyin_ids_for_this_poi - existing_feishu_ids
-        
-        if not new_ids_to_add:
-            print("    -> 所有商品ID均已存在于飞书，无需操作。")
-        else:
-            print(f"    -> 发现 {len(new_ids_to_add)} 个新ID，准备写入...")
-            success = add_records_to_feishu(feishu_client, FEISHU_BITABLE_APP_TOKEN, FEISHU_BITABLE_TABLE_ID, TARGET_FIELD_NAME, list(new_ids_to_add))
-            
-            if success:
-                existing_feishu_ids.update(new_ids_to_add)
-                total_new_ids_written += len(new_ids_to_add)
-
-    print("="*60)
-    print(">>> 任务执行完毕 <<<")
-    print(f"总计新增了 {total_new_ids_written} 条记录到飞书多维表格。")
-
-if __name__ == "__main__":
-    main()
+import requests
+import time
+import json
+import math
+import queue
+from feishu_bitable import BitableClient, field_text
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# =================================================================
+# 1. 配置信息
+# =================================================================
+
+# --- 从环境变量读取密钥 (Secrets) ---
+# 使用专属的、清晰的变量名
+DOUYIN_APP_ID = os.getenv("DOUYIN_APP_ID")
+DOUYIN_APP_SECRET = os.getenv("DOUYIN_APP_SECRET")
+FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
+FEISHU_APP_SECRET = os.getenv("FEISHU_APP_SECRET")
+
+# --- 直接硬编码的任务相关ID ---
+DOUYIN_ACCOUNT_ID = "7241078611527075855"
+FEISHU_BITABLE_APP_TOKEN = "MslRbdwPca7P6qsqbqgcvpBGnRh"
+FEISHU_BITABLE_TABLE_ID = "tbl6jUYvV6TXXOZ2"
+TARGET_FIELD_NAME = "商品ID"
+
+# --- 接口地址 (默认线上地址，压测时可指向本地模拟服务) ---
+DOUYIN_API_BASE = os.getenv("DOUYIN_API_BASE", "https://open.douyin.com").rstrip("/")
+FEISHU_API_BASE = os.getenv("FEISHU_API_BASE", "https://open.feishu.cn").rstrip("/")
+
+# --- 并发抓取配置 ---
+# 同时抓取商品的门店数上限，以及对同一域名每秒最多发出的请求数 (<=0 表示不限速)
+POI_FETCH_CONCURRENCY = int(os.getenv("POI_FETCH_CONCURRENCY", "8"))
+DOUYIN_MAX_RPS = float(os.getenv("DOUYIN_MAX_RPS", "10"))
+# 每次商品查询携带的门店数；同一连锁的商品大多跨店共享，合并查询可大幅减少重复下载 (设为 1 即逐店查询)
+POI_BATCH_SIZE = int(os.getenv("POI_BATCH_SIZE", "10"))
+
+# --- 飞书写入配置 ---
+# batch_create 单次最多 500 条；失败的批次最多重试的次数
+FEISHU_BATCH_LIMIT = 500
+FEISHU_WRITE_RETRIES = int(os.getenv("FEISHU_WRITE_RETRIES", "3"))
+
+# --- 本地商品ID索引 ---
+# 已写入飞书的商品ID缓存在本地 SQLite 中；只有超过对账周期或显式要求时才全表读取飞书重新对账
+FEISHU_INDEX_FILE = os.getenv("FEISHU_INDEX_FILE", "feishu_product_ids.sqlite3")
+FEISHU_INDEX_RECONCILE_DAYS = float(os.getenv("FEISHU_INDEX_RECONCILE_DAYS", "7"))
+FEISHU_INDEX_FORCE_RECONCILE = os.getenv("FEISHU_INDEX_FORCE_RECONCILE", "").lower() in ("1", "true", "yes")
+
+# --- 门店POI列表缓存 ---
+# 门店列表变化很少，缓存有效期内直接使用本地结果；门店增减后可设置 POI_CACHE_FORCE_REFRESH 强制刷新
+POI_CACHE_FILE = os.getenv("POI_CACHE_FILE", "douyin_poi_cache.json")
+POI_CACHE_TTL_HOURS = float(os.getenv("POI_CACHE_TTL_HOURS", "24"))
+POI_CACHE_FORCE_REFRESH = os.getenv("POI_CACHE_FORCE_REFRESH", "").lower() in ("1", "true", "yes")
+POI_PAGE_SIZE = 50
+POI_PAGE_RETRIES = int(os.getenv("POI_PAGE_RETRIES", "3"))
+
+# --- 流水线配置 ---
+# 抓取 → 比对 → 写入 各阶段之间的队列长度上限，队列满时上游阶段阻塞等待 (背压)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+
+# =================================================================
+# 2. API 调用函数
+# (这部分核心逻辑无变化)
+# =================================================================
+
+class HostRateLimiter:
+    """按域名限制每秒请求数，线程安全，供所有并发 worker 共享。"""
+    def __init__(self, max_rps):
+        self.min_interval = 1.0 / max_rps if max_rps > 0 else 0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        if not self.min_interval: return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+douyin_rate_limiter = HostRateLimiter(DOUYIN_MAX_RPS)
+
+# 共享连接池，避免每个请求重新握手
+douyin_session = requests.Session()
+_douyin_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(POI_FETCH_CONCURRENCY, 10))
+douyin_session.mount("https://", _douyin_adapter)
+douyin_session.mount("http://", _douyin_adapter)
+
+def get_douyin_token():
+    """获取抖音 access-token (带详细错误日志)"""
+    print(">>> 正在获取抖音 access-token...")
+    if not DOUYIN_APP_ID or not DOUYIN_APP_SECRET:
+        print("    -> 错误: 抖音的 DOUYIN_APP_ID 或 DOUYIN_APP_SECRET 环境变量未设置！请检查GitHub Actions的Secrets配置。")
+        return None
+        
+    url = f"{DOUYIN_API_BASE}/oauth/client_token/"
+    payload = {"grant_type": "client_credential", "client_key": DOUYIN_APP_ID, "client_secret": DOUYIN_APP_SECRET}
+    try:
+        response = requests.post(url, headers={'Content-Type': 'application/json'}, json=payload, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("data", {}).get("error_code") == 0:
+            print("    -> 抖音 access-token 获取成功！")
+            return data["data"]["access_token"]
+        else:
+            print(f"    -> 抖音 API 返回业务错误: {data}")
+            return None
+    except requests.exceptions.Timeout:
+        print("    -> 抖音 access-token 获取失败: 请求超时 (Timeout)。")
+    except requests.exceptions.RequestException as e:
+        print(f"    -> 抖音 access-token 获取失败: 发生网络请求错误。")
+        print(f"       具体异常 (Exception): {e}")
+    except Exception as e:
+        print(f"    -> 抖音 access-token 获取失败: 发生未知错误。")
+        print(f"       具体异常 (Exception): {e}")
+    return None
+
+def fetch_poi_page(douyin_token, account_id, page, retries=POI_PAGE_RETRIES):
+    """获取单页门店，失败按指数退避重试。返回 (poi_id 列表, 接口返回的门店总数或 None)，重试耗尽时抛出异常。"""
+    poi_url = f"{DOUYIN_API_BASE}/goodlife/v1/shop/poi/query/"
+    params = {'account_id': account_id, 'page': page, 'size': POI_PAGE_SIZE}
+    for attempt in range(1, max(1, retries) + 1):
+        try:
+            douyin_rate_limiter.wait(poi_url)
+            response = douyin_session.get(poi_url, headers={'Content-Type': 'application/json', 'access-token': douyin_token}, params=params, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            if data.get("data", {}).get("error_code") != 0:
+                raise Exception(f"抖音 API 返回业务错误: {data}")
+            pois = data["data"].get("pois", [])
+            total = data["data"].get("total")
+            return [p.get("poi", {}).get("poi_id") for p in pois if p.get("poi", {}).get("poi_id")], total if isinstance(total, int) else None
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            print(f"    -> 第 {page} 页门店获取失败 ({e})，{2 ** attempt} 秒后重试...")
+            time.sleep(2 ** attempt)
+
+def get_douyin_poi_list(douyin_token, account_id):
+    """从抖音拉取全部门店ID。首页确定总数后其余页并发获取；任一页重试后仍失败时返回 None。"""
+    print("\n>>> 正在从抖音获取所有门店POI列表...")
+    try:
+        poi_ids, total = fetch_poi_page(douyin_token, account_id, 1)
+        if len(poi_ids) >= POI_PAGE_SIZE:
+            if total:
+                pages = list(range(2, math.ceil(total / POI_PAGE_SIZE) + 1))
+                print(f"    -> 门店总数 {total}，并发获取剩余 {len(pages)} 页...")
+                with ThreadPoolExecutor(max_workers=max(1, min(POI_FETCH_CONCURRENCY, len(pages) or 1))) as executor:
+                    for page_ids, _ in executor.map(lambda page: fetch_poi_page(douyin_token, account_id, page), pages):
+                        poi_ids.extend(page_ids)
+            else:
+                # 接口未返回总数时只能逐页翻到最后一页
+                page = 2
+                while True:
+                    page_ids, _ = fetch_poi_page(douyin_token, account_id, page)
+                    poi_ids.extend(page_ids)
+                    if len(page_ids) < POI_PAGE_SIZE: break
+                    page += 1
+    except Exception as e:
+        print(f"    -> 获取门店列表失败: {e}")
+        return None
+    poi_ids = list(dict.fromkeys(poi_ids))
+    print(f"    -> 成功获取到 {len(poi_ids)} 个门店ID。")
+    return poi_ids
+
+def load_douyin_poi_list(douyin_token, account_id, cache_file=POI_CACHE_FILE, ttl_hours=POI_CACHE_TTL_HOURS, force_refresh=POI_CACHE_FORCE_REFRESH):
+    """带 TTL 的门店列表缓存。缓存过期或强制刷新时重新拉取，拉取失败则退回使用旧缓存。"""
+    cache = None
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get("account_id") != account_id: cache = None
+        except Exception as e:
+            print(f"\n>>> 读取门店缓存 '{cache_file}' 失败，将重新拉取: {e}")
+            cache = None
+    if cache and not force_refresh:
+        age_hours = (time.time() - cache.get("fetched_at", 0)) / 3600
+        if age_hours < ttl_hours:
+            print(f"\n>>> 使用门店缓存 '{cache_file}' 中的 {len(cache['poi_ids'])} 个门店ID (缓存于 {age_hours:.1f} 小时前)。")
+            return cache["poi_ids"]
+    poi_ids = get_douyin_poi_list(douyin_token, account_id)
+    if poi_ids is None:
+        if cache:
+            print(f"    -> 改用旧的门店缓存 ({len(cache['poi_ids'])} 个门店ID)。")
+            return cache["poi_ids"]
+        return []
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump({"account_id": account_id, "fetched_at": time.time(), "poi_ids": poi_ids}, f, ensure_ascii=False)
+    return poi_ids
+
+def get_products_for_poi_batch(douyin_token, account_id, poi_ids):
+    """一次查询携带多个门店ID，按游标翻页，返回这组门店去重后的商品ID集合。"""
+    product_ids = set()
+    cursor = None
+    product_url = f"{DOUYIN_API_BASE}/goodlife/v1/goods/product/online/query/"
+    while True:
+        params = {'account_id': account_id, 'poi_ids': list(poi_ids), 'count': 50}
+        if cursor: params['cursor'] = cursor
+        try:
+            douyin_rate_limiter.wait(product_url)
+            response = douyin_session.get(product_url, headers={'content-type': 'application/json', 'access-token': douyin_token}, params=params, timeout=30)
+            data = response.json()
+            if data.get("data", {}).get("error_code") == 0:
+                products = data["data"].get("products", [])
+                for p in products:
+                    prod_info = p.get("product", {})
+                    if prod_info.get("product_id"):
+                        product_ids.add(prod_info["product_id"])
+                if data["data"].get("has_more"):
+                    cursor = data["data"].get("next_cursor")
+                else: break
+            else: break
+        except Exception: break
+    return product_ids
+
+def get_products_for_single_poi(douyin_token, account_id, poi_id):
+    return get_products_for_poi_batch(douyin_token, account_id, [poi_id])
+
+def get_all_feishu_product_ids(feishu_client, app_token, table_id, field_name, strict=False):
+    """全表读取飞书中的商品ID。strict=True 时查询失败直接抛出异常，而不是返回不完整的结果。"""
+    print(f"\n>>> 正在从飞书多维表格 '{table_id}' 获取已有的 '{field_name}' 作为基准数据...")
+    existing_ids = set()
+    try:
+        # iter_records 在处理当前页时已经在请求下一页
+        for item in feishu_client.iter_records(app_token, table_id, field_names=[field_name], use_search=True):
+            text_value = field_text(item.fields.get(field_name))
+            if text_value:
+                existing_ids.add(text_value)
+    except Exception as e:
+        print(f"    -> 查询飞书记录时发生异常: {e}")
+        if strict: raise
+    print(f"    -> 基准数据获取完毕，飞书侧现有 {len(existing_ids)} 个ID。")
+    return existing_ids
+
+def add_records_to_feishu(feishu_client, app_token, table_id, field_name, new_ids_chunk, client_token=None):
+    """client_token 为飞书的幂等键，重试同一批记录时传入同一个值，写入成功但响应丢失时不会重复新增。"""
+    if not new_ids_chunk: return True
+    print(f"    -> 正在向飞书写入 {len(new_ids_chunk)} 条新记录...")
+    try:
+        response = feishu_client.batch_create(app_token, table_id, [{field_name: new_id} for new_id in new_ids_chunk],
+                                              client_token=client_token)
+        if not response.success():
+            print(f"    -> 批次写入失败, code: {response.code}, msg: {response.msg}")
+            return False
+        else:
+            print(f"    -> 批次写入成功！")
+            return True
+    except Exception as e:
+        print(f"    -> 批次写入时发生异常: {e}")
+        return False
+
+class FeishuProductIndex:
+    """本地 SQLite 索引，保存已写入飞书的商品ID，以及上次与飞书全量对账的时间。"""
+    def __init__(self, path):
+        self.path = path
+        # 流水线中由写入线程更新索引，同一时刻只有一个线程使用连接
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS product_ids (product_id TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def load_ids(self):
+        return {row[0] for row in self.conn.execute("SELECT product_id FROM product_ids")}
+
+    def add_ids(self, product_ids):
+        self.conn.executemany("INSERT OR IGNORE INTO product_ids (product_id) VALUES (?)", [(pid,) for pid in product_ids])
+        self.conn.commit()
+
+    def replace_all(self, product_ids):
+        """用飞书全量结果覆盖本地索引，并记录对账时间。"""
+        with self.conn:
+            self.conn.execute("DELETE FROM product_ids")
+            self.conn.executemany("INSERT OR IGNORE INTO product_ids (product_id) VALUES (?)", [(pid,) for pid in product_ids])
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_reconciled_at', ?)", (str(time.time()),))
+
+    def last_reconciled_at(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_reconciled_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def needs_reconcile(self, max_age_days=FEISHU_INDEX_RECONCILE_DAYS, force=FEISHU_INDEX_FORCE_RECONCILE):
+        last = self.last_reconciled_at()
+        return force or last is None or time.time() - last > max_age_days * 86400
+
+    def close(self):
+        self.conn.close()
+
+def load_existing_feishu_ids(feishu_client, index):
+    """优先使用本地索引；到期或要求对账时才全表读取飞书并刷新索引。失败且本地无数据时返回 None。"""
+    if not index.needs_reconcile():
+        existing_ids = index.load_ids()
+        age_hours = (time.time() - index.last_reconciled_at()) / 3600
+        print(f"\n>>> 使用本地索引 '{index.path}' 中的 {len(existing_ids)} 个已知商品ID (距上次对账 {age_hours:.1f} 小时)。")
+        return existing_ids
+    print(f"\n>>> 本地索引需要与飞书全量对账 (周期: {FEISHU_INDEX_RECONCILE_DAYS} 天, 强制: {FEISHU_INDEX_FORCE_RECONCILE})...")
+    try:
+        existing_ids = get_all_feishu_product_ids(feishu_client, FEISHU_BITABLE_APP_TOKEN, FEISHU_BITABLE_TABLE_ID, TARGET_FIELD_NAME, strict=True)
+    except Exception:
+        existing_ids = index.load_ids()
+        if not existing_ids:
+            print("    -> 对账失败且本地索引为空，无法判断哪些商品已存在。")
+            return None
+        print(f"    -> 对账失败，暂时沿用本地索引中的 {len(existing_ids)} 个ID，下次运行将再次尝试对账。")
+        return existing_ids
+    index.replace_all(existing_ids)
+    print(f"    -> 对账完成，本地索引已更新为 {len(existing_ids)} 个ID。")
+    return existing_ids
+
+class FeishuWriteBuffer:
+    """整个运行共享的写缓冲：攒满 500 条整批写入，结束时 flush 剩余部分，失败时只重试失败的那一批。"""
+    def __init__(self, feishu_client, app_token, table_id, field_name, chunk_size=FEISHU_BATCH_LIMIT, max_retries=FEISHU_WRITE_RETRIES, index=None):
+        self.feishu_client = feishu_client
+        self.app_token = app_token
+        self.table_id = table_id
+        self.field_name = field_name
+        self.chunk_size = chunk_size
+        self.max_retries = max(1, max_retries)
+        self.index = index
+        self.pending = []
+        self.written_ids = set()
+        self.failed_chunks = []
+        self.round_trips = 0
+
+    def add(self, new_ids):
+        self.pending.extend(new_ids)
+        while len(self.pending) >= self.chunk_size:
+            chunk, self.pending = self.pending[:self.chunk_size], self.pending[self.chunk_size:]
+            self._write_chunk(chunk)
+
+    def flush(self):
+        """写出不足一整批的剩余记录，返回本次运行是否全部写入成功。"""
+        if self.pending:
+            chunk, self.pending = self.pending, []
+            self._write_chunk(chunk)
+        return not self.failed_chunks
+
+    def _write_chunk(self, chunk):
+        # 超时等失败时飞书可能已经写入，每次重试使用同一个 client_token 避免重复新增
+        client_token = str(uuid.uuid4())
+        for attempt in range(1, self.max_retries + 1):
+            self.round_trips += 1
+            if add_records_to_feishu(self.feishu_client, self.app_token, self.table_id, self.field_name, chunk, client_token):
+                self.written_ids.update(chunk)
+                if self.index: self.index.add_ids(chunk)
+                return True
+            if attempt < self.max_retries:
+                print(f"    -> 第 {attempt} 次写入失败，{2 ** attempt} 秒后重试该批次...")
+                time.sleep(2 ** attempt)
+        print(f"    -> 该批次 {len(chunk)} 条记录重试 {self.max_retries} 次后仍失败，放弃。")
+        self.failed_chunks.append(chunk)
+        return False
+
+_STAGE_DONE = object()
+
+def run_sync_pipeline(douyin_token, account_id, poi_ids, existing_ids, write_buffer,
+                      max_workers=POI_FETCH_CONCURRENCY, batch_size=POI_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+    """抖音抓取、比对去重、飞书写入三个阶段同时运行，阶段之间用有界队列传递数据。
+
+    抓取阶段把每组门店的商品ID放入队列，比对阶段过滤掉 existing_ids 中已有的ID，
+    写入阶段把新ID交给 write_buffer 攒批写入。返回抓取结果的统计信息。
+    """
+    batch_size = max(1, batch_size)
+    batches = [poi_ids[i:i+batch_size] for i in range(0, len(poi_ids), batch_size)]
+    fetched_queue = queue.Queue(maxsize=max(1, queue_size))
+    new_id_queue = queue.Queue(maxsize=max(1, queue_size))
+    stats = {"batches": len(batches), "fetched": 0, "unique": 0, "new": 0}
+    print(f"\n>>> 流水线启动: {len(poi_ids)} 家门店分 {len(batches)} 组抓取 (每组 {batch_size} 家，并发上限: {max_workers}, 限速: {DOUYIN_MAX_RPS} 次/秒, 队列上限: {queue_size})...")
+
+    def fetch_batch(i, batch):
+        try:
+            product_ids = get_products_for_poi_batch(douyin_token, account_id, batch)
+        except Exception as e:
+            print(f"    -> 第 {i+1} 组门店抓取异常: {e}")
+            product_ids = set()
+        fetched_queue.put((i, batch, product_ids))
+
+    def fetch_stage():
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                for i, batch in enumerate(batches):
+                    executor.submit(fetch_batch, i, batch)
+        finally:
+            fetched_queue.put(_STAGE_DONE)
+
+    def diff_stage():
+        seen_ids = set()
+        done = 0
+        try:
+            while True:
+                item = fetched_queue.get()
+                if item is _STAGE_DONE: break
+                i, batch, product_ids = item
+                done += 1
+                stats["fetched"] += len(product_ids)
+                seen_ids.update(product_ids)
+                new_ids = product_ids - existing_ids
+                print(f"    -> [{done}/{len(batches)}] 第 {i+1} 组门店 (POI ID: {', '.join(map(str, batch))}): 商品 {len(product_ids)} 个，新ID {len(new_ids)} 个")
+                if new_ids:
+                    # 进入写入队列即视为已知，避免后续门店组重复排队
+                    existing_ids.update(new_ids)
+                    stats["new"] += len(new_ids)
+                    new_id_queue.put(sorted(new_ids))
+        finally:
+            stats["unique"] = len(seen_ids)
+            new_id_queue.put(_STAGE_DONE)
+
+    def write_stage():
+        try:
+            while True:
+                new_ids = new_id_queue.get()
+                if new_ids is _STAGE_DONE: break
+                write_buffer.add(new_ids)
+        finally:
+            write_buffer.flush()
+
+    start = time.monotonic()
+    stages = [threading.Thread(target=stage, name=stage.__name__) for stage in (fetch_stage, diff_stage, write_stage)]
+    for stage in stages: stage.start()
+    for stage in stages: stage.join()
+    print(f"    -> 流水线结束，耗时 {time.monotonic() - start:.1f} 秒，共 {stats['fetched']} 条抓取结果，"
+          f"去重后 {stats['unique']} 个商品ID，其中新ID {stats['new']} 个。")
+    return stats
+
+def main():
+    douyin_token = get_douyin_token()
+    if not douyin_token:
+        print("\n获取抖音Token失败，任务中止。")
+        return
+        
+    print("\n>>> 正在初始化飞书客户端 (自动缓存Token，复用连接池)...")
+    feishu_client = BitableClient(FEISHU_APP_ID, FEISHU_APP_SECRET, base_url=FEISHU_API_BASE)
+    print("    -> 飞书客户端初始化成功！")
+
+    product_index = FeishuProductIndex(FEISHU_INDEX_FILE)
+    existing_feishu_ids = load_existing_feishu_ids(feishu_client, product_index)
+    if existing_feishu_ids is None:
+        print("\n获取飞书已有商品ID失败，任务中止。")
+        product_index.close()
+        return
+    all_poi_ids = load_douyin_poi_list(douyin_token, DOUYIN_ACCOUNT_ID)
+    if not all_poi_ids:
+        print("\n未能获取到任何门店，任务中止。")
+        product_index.close()
+        return
+    
+    print(f"\n>>> [正式运行] 开始处理全部 {len(all_poi_ids)} 家门店的数据...")
+    print("="*60)
+    
+    write_buffer = FeishuWriteBuffer(feishu_client, FEISHU_BITABLE_APP_TOKEN, FEISHU_BITABLE_TABLE_ID, TARGET_FIELD_NAME, index=product_index)
+    run_sync_pipeline(douyin_token, DOUYIN_ACCOUNT_ID, all_poi_ids, existing_feishu_ids, write_buffer)
+    product_index.close()
+
+    print("="*60)
+    print(">>> 任务执行完毕 <<<")
+    print(f"总计新增了 {len(write_buffer.written_ids)} 条记录到飞书多维表格 (飞书写入请求 {write_buffer.round_trips} 次)。")
+    if write_buffer.failed_chunks:
+        print(f"警告: 有 {sum(len(c) for c in write_buffer.failed_chunks)} 条记录写入失败，将在下次运行时重新尝试。")
+    print(feishu_client.stats.summary())
+    feishu_client.close()
+
+if __name__ == "__main__":
+    main()
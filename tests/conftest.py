@@ -0,0 +1,44 @@
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def douyin():
+    """1109抖音.py 的文件名不是合法的标识符，只能通过 importlib 导入。
+
+    模块导入时会用 TextIOWrapper 重新包装 sys.stdout.buffer，这会关闭 pytest 的输出捕获，
+    导入期间换成没有 buffer 属性的 StringIO 跳过这一步。
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+    try:
+        return importlib.import_module("1109抖音")
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+@pytest.fixture(scope="session")
+def store_sync():
+    return importlib.import_module("更新门店数据")
+
+
+@pytest.fixture
+def manager(store_sync):
+    """不连接飞书的 FeishuBitableManager，测试把 async_client 换成 FakeAsyncTable。"""
+    manager = store_sync.FeishuBitableManager("app-id", "app-secret", max_retries=1, backend="sdk")
+    return manager
+
+
+@pytest.fixture
+def range_server():
+    from range_server import RangeServer
+    server = RangeServer(os.urandom(50_000))
+    yield server
+    server.stop()
@@ -0,0 +1,48 @@
+"""内存中的多维表格，实现 FeishuBitableManager 用到的 AsyncBitableClient 接口。"""
+from feishu_bitable import BitableError, BitableResponse
+
+
+class FakeAsyncTable:
+    def __init__(self, field_name, values=(), fail_list=False, lose_create_responses=0, fail_delete=False):
+        self.field_name = field_name
+        self.records = {f"rec{i}": value for i, value in enumerate(values)}
+        self.next_id = len(self.records)
+        self.fail_list = fail_list
+        # 前 N 次 batch_create 写入成功但响应丢失 (如读取超时)，调用方只能看到失败
+        self.lose_create_responses = lose_create_responses
+        self.fail_delete = fail_delete
+        self.created_by_token = {}
+        self.calls = []
+
+    def values(self):
+        return sorted(self.records.values())
+
+    async def iter_records(self, app_token, table_id, field_names=None):
+        self.calls.append("list")
+        if self.fail_list: raise BitableError(-1, "ReadTimeout")
+        for record_id, value in list(self.records.items()):
+            yield BitableResponse._wrap({"items": [{"record_id": record_id, "fields": {self.field_name: value}}]}).items[0]
+
+    async def batch_create(self, app_token, table_id, records, client_token=None):
+        self.calls.append(("create", len(records)))
+        if client_token in self.created_by_token:
+            return BitableResponse(0, "success", {"records": self.created_by_token[client_token]})
+        created = []
+        for fields in records:
+            record_id = f"rec{self.next_id}"
+            self.next_id += 1
+            self.records[record_id] = fields[self.field_name]
+            created.append({"record_id": record_id, "fields": fields})
+        if client_token: self.created_by_token[client_token] = created
+        if self.lose_create_responses:
+            self.lose_create_responses -= 1
+            return BitableResponse(-1, "ReadTimeout: timed out")
+        return BitableResponse(0, "success", {"records": created})
+
+    async def batch_delete(self, app_token, table_id, record_ids):
+        self.calls.append(("delete", len(record_ids)))
+        if self.fail_delete: return BitableResponse(-1, "ReadTimeout: timed out")
+        missing = [record_id for record_id in record_ids if record_id not in self.records]
+        if missing: return BitableResponse(1254043, "RecordIdNotFound")
+        for record_id in record_ids: del self.records[record_id]
+        return BitableResponse(0, "success", {"records": [{"record_id": r, "deleted": True} for r in record_ids]})
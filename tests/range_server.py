@@ -0,0 +1,71 @@
+"""支持 Range、If-Range 的本地 HTTP 服务，供 ranged_download 的测试使用。"""
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server.owner
+        content, etag = server.content, server.etag
+        range_header = self.headers.get("Range", "")
+        if_range = self.headers.get("If-Range")
+        server.requests.append({"range": range_header, "if_range": if_range})
+        match = re.match(r"bytes=(\d+)-(\d*)", range_header)
+        if match and server.ranges and (if_range is None or if_range == etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = content[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        else:
+            data = content
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if len(server.requests) == server.drop_request:
+            # 第 drop_request 个请求只发出一半数据就断开连接，模拟下载中断
+            data = data[:len(data) // 2]
+            self.close_connection = True
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeServer:
+    def __init__(self, content: bytes, ranges: bool = True):
+        self.ranges = ranges
+        self.drop_request = None
+        self.requests = []
+        self.set_content(content)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.owner = self
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def set_content(self, content: bytes):
+        """替换文件内容，ETag 随内容变化。"""
+        self.content = content
+        self.etag = '"%s"' % hashlib.sha1(content).hexdigest()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/video.mp4"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,24 @@
+import os
+
+
+def test_same_title_videos_get_separate_files(douyin, range_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(douyin, "DOWNLOAD_DIR", str(tmp_path))
+    index = douyin.VideoContentIndex(str(tmp_path / "index.json"))
+
+    status, first = douyin.download_video(range_server.url, "同一个标题", "7300000000000000001", index)
+    assert status == "Success"
+    range_server.set_content(os.urandom(20_000))
+    status, second = douyin.download_video(range_server.url, "同一个标题", "7300000000000000002", index)
+    assert status == "Success"
+
+    assert first != second
+    with open(second, "rb") as f: assert f.read() == range_server.content
+    assert os.path.basename(first) == "7300000000000000001_同一个标题.mp4"
+
+
+def test_media_file_stem(douyin):
+    assert douyin.media_file_stem("7300000000000000001", "") == "7300000000000000001"
+    assert douyin.media_file_stem("7300000000000000001", 'a/b:c') == "7300000000000000001_abc"
+    # 没有 aweme_id 时用的是视频链接，不能直接放进文件名
+    stem = douyin.media_file_stem("https://v.douyin.com/abc?x=1", "标题")
+    assert stem.endswith("_标题") and "/" not in stem
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+
+import pytest
+import requests
+
+from ranged_download import download_file, remove_stale_parts
+
+# 小分段、不并发，少量数据也会发出多个 Range 请求
+OPTIONS = {"part_size": 4096, "parallel": 1, "retries": 0}
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_interrupted_download_resumes_from_part(range_server, tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    range_server.drop_request = 2
+    with pytest.raises(requests.exceptions.RequestException):
+        download_file(range_server.url, dest, hash_name="sha256", **OPTIONS)
+    assert os.path.getsize(dest + ".part") == 4096
+    meta = json.load(open(dest + ".part.json", encoding="utf-8"))
+    assert meta["etag"] == range_server.etag and meta["total"] == len(range_server.content)
+
+    size, digest = download_file(range_server.url, dest, hash_name="sha256", **OPTIONS)
+    assert (size, digest) == (len(range_server.content), sha256(range_server.content))
+    assert range_server.requests[2] == {"range": "bytes=4096-8191", "if_range": range_server.etag}
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+
+
+@pytest.mark.parametrize("new_length", [50_000, 60_000, 500])
+def test_changed_file_discards_part(range_server, tmp_path, new_length):
+    dest = str(tmp_path / "video.mp4")
+    range_server.drop_request = 2
+    with pytest.raises(requests.exceptions.RequestException):
+        download_file(range_server.url, dest, **OPTIONS)
+    assert os.path.getsize(dest + ".part") == 4096
+
+    # 同样长度 (只有 ETag 变化)、变长、变得比已下载部分还短
+    range_server.set_content(os.urandom(new_length))
+    size, digest = download_file(range_server.url, dest, hash_name="sha256", **OPTIONS)
+    assert (size, digest) == (new_length, sha256(range_server.content))
+    with open(dest, "rb") as f: assert f.read() == range_server.content
+
+
+def test_part_without_validators_is_not_resumed(range_server, tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    with open(dest + ".part", "wb") as f: f.write(b"x" * 4096)
+    download_file(range_server.url, dest, **OPTIONS)
+    with open(dest, "rb") as f: assert f.read() == range_server.content
+    assert range_server.requests[0]["range"].startswith("bytes=0-")
+
+
+def test_server_without_range_support_restarts(range_server, tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    range_server.drop_request = 2
+    with pytest.raises(requests.exceptions.RequestException):
+        download_file(range_server.url, dest, **OPTIONS)
+    range_server.ranges = False
+    download_file(range_server.url, dest, **OPTIONS)
+    with open(dest, "rb") as f: assert f.read() == range_server.content
+
+
+def test_remove_stale_parts(tmp_path):
+    for name in ("old.mp4.part", "old.mp4.part.json", "new.mp4.part", "done.mp4"):
+        (tmp_path / name).write_bytes(b"x")
+    for name in ("old.mp4.part", "old.mp4.part.json", "done.mp4"):
+        os.utime(tmp_path / name, (0, 0))
+    assert remove_stale_parts(str(tmp_path), max_age_hours=1) == 2
+    assert sorted(os.listdir(tmp_path)) == ["done.mp4", "new.mp4.part"]
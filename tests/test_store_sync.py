@@ -0,0 +1,179 @@
+import asyncio
+
+from fake_bitable import FakeAsyncTable
+
+FIELD = "门店名称"
+
+
+def store_page(names, total, has_more):
+    return {"status_code": 0, "data": {
+        "poi_list": [{"poi_id": str(i), "poi_name": name} for i, name in enumerate(names)],
+        "recommend_list": [{"poi_name": "推荐门店"}],
+        "total": total, "has_more": has_more,
+    }}
+
+
+def test_parse_store_page_reads_only_the_list_path(store_sync):
+    page = store_sync.parse_store_page(store_page(["A", "B"], 5, True))
+    assert page == {"names": ["A", "B"], "total": 5, "has_more": True}
+    assert store_sync.parse_store_page({"data": {"filters": [{"poi_name": "A"}]}}) is None
+
+
+def test_collect_store_pages_requires_every_page(store_sync):
+    parse = store_sync.parse_store_page
+    first = parse(store_page(["A", "B"], 5, True))
+    second = parse(store_page(["C", "D"], 5, True))
+    last = parse(store_page(["E"], 5, False))
+
+    assert store_sync.collect_store_pages({1: first}) == (["A", "B"], False)
+    assert store_sync.collect_store_pages({1: first, 3: last}) == (["A", "B"], False)
+    assert store_sync.collect_store_pages({1: first, 2: second, 3: last}) == (["A", "B", "C", "D", "E"], True)
+    # 没有 has_more 和 total 时无法判断是否完整
+    assert store_sync.collect_store_pages({1: {"names": ["A"], "total": None, "has_more": None}}) == (["A"], False)
+
+
+def test_page_url_replaces_page_param(store_sync):
+    url = "https://life.douyin.com/life/shop/poi/list?page=1&page_size=20"
+    assert store_sync.page_url(url, 3) == "https://life.douyin.com/life/shop/poi/list?page_size=20&page=3"
+    assert store_sync.page_number_of(store_sync.page_url(url, 3)) == 3
+
+
+def test_reconcile_partial_list_only_adds(manager):
+    table = FakeAsyncTable(FIELD, ["A", "B", "C", "C"])
+    manager.async_client = table
+    partial = [{FIELD: "A"}, {FIELD: "D"}]
+
+    summary = asyncio.run(manager.reconcile_records("app", "tbl", partial, FIELD, allow_delete=False))
+    assert summary["created"] == 1 and summary["deleted"] == 0
+    assert table.values() == ["A", "B", "C", "C", "D"]
+
+    summary = asyncio.run(manager.reconcile_records("app", "tbl", partial, FIELD))
+    assert summary["deleted"] == 3
+    assert table.values() == ["A", "D"]
+
+
+def test_bulk_journal_resumes_pending_chunks(store_sync, tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = store_sync.BulkJournal(path, "reconcile:app:tbl:abc")
+    journal.plan("删除", [f"rec{i}" for i in range(1200)])
+    journal.mark_done("删除", 0)
+
+    resumed = store_sync.BulkJournal(path, "reconcile:app:tbl:abc")
+    assert resumed.resumed
+    assert [(index, len(items)) for index, items in resumed.pending("删除")] == [(1, 500), (2, 200)]
+    # 门店列表变化后是另一次任务，旧日志被丢弃
+    assert not store_sync.BulkJournal(path, "reconcile:app:tbl:def").resumed
+
+
+def test_resumed_delete_skips_records_already_deleted(store_sync, manager, tmp_path):
+    table = FakeAsyncTable(FIELD, ["A", "B", "C", "D"])
+    manager.async_client = table
+    journal = store_sync.BulkJournal(str(tmp_path / "journal.json"), "reconcile:app:tbl:abc")
+    journal.plan("新增", [])
+    journal.plan("删除", ["rec1", "rec2"])
+    # 上次运行在飞书删除了 rec1 之后、标记分块完成之前退出
+    del table.records["rec1"]
+
+    resumed = store_sync.BulkJournal(str(tmp_path / "journal.json"), "reconcile:app:tbl:abc")
+    summary = asyncio.run(manager.reconcile_records("app", "tbl", [{FIELD: "A"}, {FIELD: "D"}], FIELD, resumed))
+    assert summary["failed_chunks"] == []
+    assert table.values() == ["A", "D"]
+    assert table.calls == [("delete", 2), "list", ("delete", 1)]
+    assert resumed.pending("删除") == []
+
+
+def test_failed_listing_is_not_treated_as_empty_table(store_sync, manager, tmp_path):
+    manager.async_client = FakeAsyncTable(FIELD, ["A", "B"], fail_list=True)
+    journal = store_sync.BulkJournal(str(tmp_path / "journal.json"), "replace:app:tbl:abc")
+
+    assert asyncio.run(manager.clear_table("app", "tbl", journal)) is None
+    assert not journal.has("删除")
+    assert asyncio.run(manager.reconcile_records("app", "tbl", [{FIELD: "A"}], FIELD, journal)) is None
+    assert manager.async_client.calls == ["list", "list"]
+
+
+def test_create_retry_after_lost_response_does_not_duplicate(store_sync, manager, tmp_path, monkeypatch):
+    async def no_sleep(seconds): pass
+    monkeypatch.setattr(store_sync.asyncio, "sleep", no_sleep)
+    manager.max_retries = 3
+    table = FakeAsyncTable(FIELD, ["A"], lose_create_responses=1)
+    manager.async_client = table
+    journal = store_sync.BulkJournal(str(tmp_path / "journal.json"), "reconcile:app:tbl:abc")
+
+    summary = asyncio.run(manager.reconcile_records("app", "tbl", [{FIELD: "A"}, {FIELD: "B"}], FIELD, journal))
+    assert summary["failed_chunks"] == [] and summary["created"] == 1
+    assert table.calls.count(("create", 1)) == 2
+    assert table.values() == ["A", "B"]
+
+
+def test_failed_sync_is_not_skipped_when_list_reverts(store_sync, manager, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(store_sync, "FEISHU_SYNC_MODE", "reconcile")
+    table = FakeAsyncTable(FIELD)
+    manager.async_client = table
+    f1 = [{FIELD: "A"}, {FIELD: "B"}]
+    f2 = [{FIELD: "A"}, {FIELD: "C"}]
+
+    assert asyncio.run(store_sync.sync_to_feishu(manager, f1))
+    assert table.values() == ["A", "B"]
+
+    # 新增 C 之后删除 B 失败，表格停在 A、B、C
+    table.fail_delete = True
+    assert not asyncio.run(store_sync.sync_to_feishu(manager, f2))
+    assert table.values() == ["A", "B", "C"]
+
+    # 门店列表变回 F1：指纹与上次成功同步一致，但表格已被改过，不能跳过
+    table.fail_delete = False
+    assert asyncio.run(store_sync.sync_to_feishu(manager, f1))
+    assert table.values() == ["A", "B"]
+
+    calls = len(table.calls)
+    assert asyncio.run(store_sync.sync_to_feishu(manager, f1))
+    assert len(table.calls) == calls
+
+
+def fetcher(pages_by_number):
+    requested = []
+
+    async def fetch_page(number):
+        requested.append(number)
+        return pages_by_number(number)
+    return fetch_page, requested
+
+
+def test_fetch_store_pages_fills_missing_pages(store_sync):
+    names = [f"门店{i}" for i in range(45)]
+    parse = lambda number: store_sync.parse_store_page(store_page(names[(number - 1) * 20:number * 20], 45, number * 20 < 45))
+    pages = {1: parse(1)}
+    fetch_page, requested = fetcher(parse)
+
+    asyncio.run(store_sync.fetch_store_pages(pages, fetch_page))
+    assert requested == [2, 3]
+    assert store_sync.collect_store_pages(pages) == (names, True)
+
+
+def test_fetch_store_pages_stops_when_page_param_is_ignored(store_sync):
+    first = store_page([f"门店{i}" for i in range(20)], 45, True)
+    pages = {1: store_sync.parse_store_page(first)}
+    fetch_page, requested = fetcher(lambda number: store_sync.parse_store_page(first))
+
+    asyncio.run(store_sync.fetch_store_pages(pages, fetch_page))
+    assert requested == [2]
+    assert store_sync.collect_store_pages(pages)[1] is False
+
+
+def test_fetch_store_pages_is_bounded(store_sync):
+    # 每页都是新门店但 has_more 一直为 True：有 total 时最多 ceil(45/20) 页，没有 total 时最多 max_pages 页
+    endless = lambda total: lambda number: store_sync.parse_store_page(
+        store_page([f"门店{number}-{i}" for i in range(5 if number > 1 else 20)], total, True))
+    pages = {1: endless(45)(1)}
+    fetch_page, requested = fetcher(endless(45))
+    asyncio.run(store_sync.fetch_store_pages(pages, fetch_page))
+    assert requested == [2, 3]
+    assert store_sync.collect_store_pages(pages)[1] is False
+
+    pages = {1: endless(None)(1)}
+    fetch_page, requested = fetcher(endless(None))
+    asyncio.run(store_sync.fetch_store_pages(pages, fetch_page, max_pages=10))
+    assert requested == list(range(2, 11))
+    assert store_sync.collect_store_pages(pages)[1] is False
@@ -0,0 +1,18 @@
+from benchmarks.fake_apis import FakeBitableAPI
+from feishu_bitable import BitableClient
+
+import sync_douyin_to_feishu as sync
+
+
+def test_write_retry_after_lost_response_does_not_duplicate(monkeypatch):
+    monkeypatch.setattr(sync.time, "sleep", lambda seconds: None)
+    fake = FakeBitableAPI("商品ID", ["1"], lose_create_responses=1).start()
+    try:
+        with BitableClient("app-id", "app-secret", base_url=fake.base_url) as client:
+            buffer = sync.FeishuWriteBuffer(client, "app", "tbl", "商品ID", chunk_size=500, max_retries=3)
+            buffer.add(["2", "3"])
+            assert buffer.flush()
+        assert buffer.round_trips == 2
+        assert sorted(fake.records) == ["1", "2", "3"]
+    finally:
+        fake.stop()
@@ -0,0 +1,48 @@
+import json
+
+
+class FlakyFeishu:
+    """第一次整表读取失败，之后返回完整的链接列表。"""
+    def __init__(self, links):
+        self.links = set(links)
+        self.calls = 0
+
+    def get_all_video_links(self, app_token, table_id):
+        self.calls += 1
+        if self.calls == 1: raise RuntimeError("飞书接口超时")
+        return set(self.links)
+
+
+def test_commit_after_failed_load_does_not_write_cache(douyin, tmp_path):
+    cache_file = tmp_path / "links.json"
+    existing = [f"https://www.douyin.com/video/{i}" for i in range(100)]
+    feishu = FlakyFeishu(existing)
+    index = douyin.VideoLinkIndex(feishu, "app", "tbl", cache_file=str(cache_file))
+
+    try:
+        index.load()
+    except RuntimeError:
+        pass
+    new_links = index.claim(["https://www.douyin.com/video/new"])
+    index.commit(new_links)
+    assert not cache_file.exists()
+
+    # 下次运行重新整表读取，而不是把只含一条新链接的缓存当成完整列表
+    next_run = douyin.VideoLinkIndex(feishu, "app", "tbl", cache_file=str(cache_file))
+    assert next_run.load() == 100
+    assert json.loads(cache_file.read_text(encoding="utf-8"))["links"] == sorted(existing)
+
+
+def test_commit_appends_to_loaded_cache_and_keeps_loaded_at(douyin, tmp_path):
+    cache_file = tmp_path / "links.json"
+    feishu = FlakyFeishu(["a", "b"])
+    feishu.calls = 1
+    index = douyin.VideoLinkIndex(feishu, "app", "tbl", cache_file=str(cache_file))
+    index.load()
+    loaded_at = json.loads(cache_file.read_text(encoding="utf-8"))["loaded_at"]
+
+    index.commit([])
+    index.commit(index.claim(["b", "c"]))
+    cache = json.loads(cache_file.read_text(encoding="utf-8"))
+    assert cache["links"] == ["a", "b", "c"]
+    assert cache["loaded_at"] == loaded_at
@@ -1,28 +1,149 @@
 import asyncio
+import hashlib
 import json
 import logging
 import os
-import pandas as pd
-from playwright.async_api import async_playwright, TimeoutError
+import re
+import itertools
+import math
+import uuid
+import openpyxl
+from playwright.async_api import TimeoutError
 import lark_oapi as lark
 from lark_oapi.api.bitable.v1 import *
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable, Iterator
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 import functools
+import datetime
+from browser_pool import AsyncBrowserPool
+
+# 未安装 httpx 时 AsyncBitableClient 为 None，退回使用 SDK
+from feishu_bitable import AsyncBitableClient, BitableError, BitableResponse, field_text
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - [%(levelname)s] - %(message)s')
-DOUYIN_COOKIE_FILE = '来客.json'
-DOUYIN_TARGET_URL = "https://life.douyin.com/p/poi-manage/home?groupid=1768205901316096"
+DOUYIN_COOKIE_FILE = os.getenv("DOUYIN_COOKIE_FILE", '来客.json')
+DOUYIN_TARGET_URL = os.getenv("DOUYIN_TARGET_URL", "https://life.douyin.com/p/poi-manage/home?groupid=1768205901316096")
+# download: 点击 '导出数据' 下载 Excel 后解析；capture: 直接截获页面门店列表接口返回的 JSON，失败时退回 download
+DOUYIN_ACQUIRE_MODE = os.getenv("DOUYIN_ACQUIRE_MODE", "download")
+# capture 模式下需要截获的接口 (正则，匹配响应 URL)、门店列表在 JSON 中的路径 (用 . 分隔) 与门店名称字段。
+# 列表所在对象中的 total/has_more 用于检查是否截获了全部分页，缺少的分页按 DOUYIN_CAPTURE_PAGE_PARAM 补充请求
+DOUYIN_CAPTURE_URL_PATTERN = os.getenv("DOUYIN_CAPTURE_URL_PATTERN", r"/life/.*poi.*/(list|query|search)")
+DOUYIN_CAPTURE_LIST_PATH = os.getenv("DOUYIN_CAPTURE_LIST_PATH", "data.poi_list")
+DOUYIN_CAPTURE_NAME_KEY = os.getenv("DOUYIN_CAPTURE_NAME_KEY", "poi_name")
+DOUYIN_CAPTURE_PAGE_PARAM = os.getenv("DOUYIN_CAPTURE_PAGE_PARAM", "page")
+# 补充请求的页数上限，防止接口不认页码参数时一直请求
+DOUYIN_CAPTURE_MAX_PAGES = int(os.getenv("DOUYIN_CAPTURE_MAX_PAGES", "200"))
+DOUYIN_CAPTURE_TIMEOUT = int(os.getenv("DOUYIN_CAPTURE_TIMEOUT", "30"))
 DOWNLOAD_DIR = "downloads"
 DOWNLOADED_FILENAME = "门店基础数据.xlsx"
 FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
 FEISHU_APP_SECRET = os.getenv("FEISHU_APP_SECRET")
 FEISHU_APP_TOKEN = "MslRbdwPca7P6qsqbqgcvpBGnRh"
 FEISHU_TABLE_ID = "tblW3GOgcvSQMPJF"
+STORE_NAME_FIELD = "门店名称"
+# reconcile: 只增删有变化的门店 (默认)；replace: 清空表格后全量重写
+FEISHU_SYNC_MODE = os.getenv("FEISHU_SYNC_MODE", "reconcile")
+# 批量删除/新增时同时在途的 500 条分块数，以及单个分块失败后的最多尝试次数
+FEISHU_WRITE_CONCURRENCY = int(os.getenv("FEISHU_WRITE_CONCURRENCY", "4"))
+FEISHU_CHUNK_RETRIES = int(os.getenv("FEISHU_CHUNK_RETRIES", "3"))
+FEISHU_CHUNK_SIZE = 500
+# 批量删除的记录ID中有已不存在的记录时，飞书返回该错误码且整批都不删除
+FEISHU_RECORD_NOT_FOUND_CODES = {1254043}
+# 上次成功同步到飞书的门店列表指纹；门店列表没有变化时跳过整个飞书阶段。
+# 表格被手动改动过时可设置 FEISHU_FORCE_SYNC 强制同步
+STORE_FINGERPRINT_FILE = os.getenv("STORE_FINGERPRINT_FILE", "store_sync_fingerprint.json")
+FEISHU_FORCE_SYNC = os.getenv("FEISHU_FORCE_SYNC", "").lower() in ("1", "true", "yes")
+# 批量删除/新增的分块日志；任务中途失败时，下次运行从第一个未完成的分块继续
+FEISHU_JOURNAL_FILE = os.getenv("FEISHU_JOURNAL_FILE", "feishu_bulk_journal.json")
+# async: 原生 asyncio 客户端 (需要 httpx)；sdk: lark-oapi 同步 SDK + 线程池
+FEISHU_BACKEND = os.getenv("FEISHU_BACKEND", "async")
+
+# --- 1. 批量操作日志 ---
+class BulkJournal:
+    """持久化记录一次批量同步任务中每个分块计划处理的记录 (记录ID 或字段) 及完成状态。
+
+    job_key 标识任务 (同步模式、表格、门店列表指纹)；文件中的任务与 job_key 不一致时视为过期并丢弃，
+    一致时只重发未完成的分块，不再重新读取整张表格。每完成一个分块就原子地写回文件。
+    每个分块在规划时分配一个 client_token，重试和续跑都使用同一个，新增分块在飞书成功、但写回日志前进程退出时也不会重复新增。
+    """
+    def __init__(self, path: str, job_key: str):
+        self.path = path
+        self.job_key = job_key
+        self.ops: Dict[str, List[Dict]] = {}
+        self.resumed = False
+        self.created_at = datetime.datetime.now().isoformat(timespec="seconds")
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f: state = json.load(f)
+            except Exception as e:
+                logging.warning(f"读取批量操作日志失败，忽略: {e}")
+                state = {}
+            if state.get("job_key") == job_key:
+                self.ops = state.get("ops", {})
+                self.created_at = state.get("created_at", self.created_at)
+                self.resumed = True
+                pending = sum(1 for chunks in self.ops.values() for c in chunks if not c["done"])
+                logging.info(f"发现未完成的批量操作日志 ({state.get('created_at')})，将从中断处继续，剩余 {pending} 个分块。")
+            else:
+                logging.info("批量操作日志属于另一次任务 (表格或门店列表已变化)，丢弃后重新规划。")
+
+    def has(self, action: str) -> bool:
+        return action in self.ops
+
+    def plan(self, action: str, items: Iterable, chunk_size: int = FEISHU_CHUNK_SIZE):
+        iterator = iter(items)
+        chunks = []
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk: break
+            chunks.append({"items": chunk, "done": False, "client_token": str(uuid.uuid4())})
+        self.ops[action] = chunks
+        self._save()
+
+    def client_token(self, action: str, index: int) -> str:
+        chunk = self.ops[action][index]
+        if not chunk.get("client_token"):
+            chunk["client_token"] = str(uuid.uuid4())
+            self._save()
+        return chunk["client_token"]
+
+    def pending(self, action: str) -> List[tuple]:
+        return [(index, c["items"]) for index, c in enumerate(self.ops.get(action, [])) if not c["done"]]
+
+    def mark_done(self, action: str, index: int):
+        self.ops[action][index]["done"] = True
+        self._save()
+
+    def complete(self):
+        """所有分块都成功后删除日志文件。"""
+        self.ops = {}
+        if os.path.exists(self.path): os.remove(self.path)
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"job_key": self.job_key, "created_at": self.created_at, "ops": self.ops}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
 
 # --- 2. 飞书多维表格操作模块 (改回使用 List API，更稳定) ---
 class FeishuBitableManager:
-    def __init__(self, app_id: str, app_secret: str):
+    def __init__(self, app_id: str, app_secret: str, max_concurrency: int = FEISHU_WRITE_CONCURRENCY, max_retries: int = FEISHU_CHUNK_RETRIES,
+                 backend: str = FEISHU_BACKEND):
         self.client = lark.Client.builder().app_id(app_id).app_secret(app_secret).log_level(lark.LogLevel.INFO).build()
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(1, max_retries)
+        self.async_client = None
+        if backend == "async":
+            if AsyncBitableClient is None:
+                logging.warning("未安装 httpx，无法使用原生异步客户端，改用 SDK 后端。")
+            else:
+                self.async_client = AsyncBitableClient(app_id, app_secret, max_connections=self.max_concurrency + 2)
+        logging.info(f"飞书多维表格后端: {'原生异步 (httpx)' if self.async_client else 'lark-oapi SDK'}")
+
+    async def close(self):
+        if self.async_client:
+            logging.info(self.async_client.stats.summary())
+            await self.async_client.aclose()
 
     async def _run_sync_in_executor(self, sync_func, *args, **kwargs):
         loop = asyncio.get_running_loop()
@@ -30,107 +151,238 @@ class FeishuBitableManager:
         return await loop.run_in_executor(None, p)
     
     # [修改] 改回使用 List API，这是获取全部记录ID最直接、最稳定的方法
-    async def _get_all_record_ids(self, app_token: str, table_id: str) -> List[str]:
-        """遍历所有分页，获取指定表格中所有记录的ID。"""
-        logging.info("开始使用 List API 获取表格中所有现有记录的ID...")
-        record_ids = []
+    async def _list_all_records(self, app_token: str, table_id: str, field_names: Optional[List[str]] = None) -> Optional[List[AppTableRecord]]:
+        """遍历所有分页，获取指定表格中的所有记录 (可只取部分字段)。任一页失败时返回 None。"""
+        if self.async_client:
+            # 异步后端在处理当前页时已经在请求下一页
+            try:
+                records = [item async for item in self.async_client.iter_records(app_token, table_id, field_names)]
+            except BitableError as e:
+                logging.error(f"List API 获取记录列表失败: {e}")
+                return None
+            logging.info(f"   - 已获取 {len(records)} 条记录。")
+            return records
+
+        records = []
         page_token = None
         has_more = True
         
         while has_more:
-            builder = ListAppTableRecordRequest.builder() \
-                .app_token(app_token) \
-                .table_id(table_id) \
-                .page_size(500)
-
-            if page_token:
-                builder.page_token(page_token)
-            
-            req = builder.build()
-            
-            resp: ListAppTableRecordResponse = await self._run_sync_in_executor(
-                self.client.bitable.v1.app_table_record.list, req
-            )
+            resp = await self._list_page(app_token, table_id, page_token, field_names)
             
             if not resp.success():
                 logging.error(f"List API 获取记录列表失败: {resp.code}, {resp.msg}, log_id: {resp.get_log_id()}")
-                return []
+                return None
 
             if resp.data.items:
-                for item in resp.data.items:
-                    record_ids.append(item.record_id)
+                records.extend(resp.data.items)
             
             has_more = resp.data.has_more
             page_token = resp.data.page_token
-            logging.info(f"   - 已获取 {len(record_ids)} 条记录ID... (更多: {has_more})")
+            logging.info(f"   - 已获取 {len(records)} 条记录... (更多: {has_more})")
         
+        return records
+
+    async def _list_page(self, app_token: str, table_id: str, page_token: Optional[str], field_names: Optional[List[str]]):
+        builder = ListAppTableRecordRequest.builder() \
+            .app_token(app_token) \
+            .table_id(table_id) \
+            .page_size(500)
+        if field_names:
+            builder.field_names(json.dumps(field_names, ensure_ascii=False))
+        if page_token:
+            builder.page_token(page_token)
+        resp: ListAppTableRecordResponse = await self._run_sync_in_executor(
+            self.client.bitable.v1.app_table_record.list, builder.build()
+        )
+        return resp
+
+    async def _run_chunks(self, action: str, items: Iterable, send_chunk, journal: Optional[BulkJournal] = None) -> List[Dict]:
+        """将 items 按 500 条分块，在信号量限制下并发调用 send_chunk(chunk, client_token)，失败的分块按指数退避重试。
+
+        同一分块的每次重试使用同一个 client_token (有日志时取自日志)，超时等结果未知的失败重试时不会重复新增。
+
+        items 可以是生成器：分块按需从中读取，同时在途的分块数不超过并发上限。
+        传入 journal 时，分块计划先写入日志 (日志中已有该操作时忽略 items)，只发送未完成的分块，每个分块成功后标记完成。
+        返回每个分块的结果摘要: {"chunk": 序号, "size": 条数, "ok": 是否成功, "attempts": 尝试次数, "error": 最后一次错误}。
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        logging.info(f"开始{action}记录，每批 {FEISHU_CHUNK_SIZE} 条，并发上限 {self.max_concurrency}...")
+
+        async def run(index: int, chunk: List) -> Dict:
+            error = None
+            client_token = journal.client_token(action, index) if journal is not None else str(uuid.uuid4())
+            try:
+                for attempt in range(1, self.max_retries + 1):
+                    try:
+                        resp = await send_chunk(chunk, client_token)
+                        if resp.success():
+                            if journal is not None: journal.mark_done(action, index)
+                            logging.info(f"   - 第 {index+1} 批成功{action} {len(chunk)} 条记录。")
+                            return {"chunk": index, "size": len(chunk), "ok": True, "attempts": attempt, "error": None}
+                        error = f"{resp.code}, {resp.msg}, log_id: {resp.get_log_id()}"
+                    except Exception as e:
+                        error = str(e)
+                    if attempt < self.max_retries:
+                        logging.warning(f"   - 第 {index+1} 批{action}失败 ({error})，{2 ** attempt} 秒后重试...")
+                        await asyncio.sleep(2 ** attempt)
+                logging.error(f"批量{action}记录失败 (第 {index+1} 批，已尝试 {self.max_retries} 次): {error}")
+                return {"chunk": index, "size": len(chunk), "ok": False, "attempts": self.max_retries, "error": error}
+            finally:
+                semaphore.release()
+
+        if journal is not None:
+            if not journal.has(action): journal.plan(action, items)
+            chunks = iter(journal.pending(action))
+        else:
+            iterator = iter(items)
+            chunks = ((index, list(itertools.islice(iterator, FEISHU_CHUNK_SIZE))) for index in itertools.count())
+        tasks = []
+        for index, chunk in chunks:
+            if not chunk: break
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(run(index, chunk)))
+        results = await asyncio.gather(*tasks)
+        failed = [r for r in results if not r["ok"]]
+        logging.info(f"{action}结束: {len(results) - len(failed)}/{len(results)} 批成功" + (f"，{sum(r['size'] for r in failed)} 条记录失败。" if failed else "。"))
+        return list(results)
+
+    async def _get_all_record_ids(self, app_token: str, table_id: str) -> Optional[List[str]]:
+        """遍历所有分页，获取指定表格中所有记录的ID。读取失败时返回 None，不能当作空表处理。"""
+        logging.info("开始使用 List API 获取表格中所有现有记录的ID...")
+        records = await self._list_all_records(app_token, table_id)
+        if records is None: return None
+        record_ids = [item.record_id for item in records]
         logging.info(f"共获取到 {len(record_ids)} 个记录ID。")
         return record_ids
 
-    async def clear_table(self, app_token: str, table_id: str):
-        """清空指定多维表格的所有记录。"""
+    async def clear_table(self, app_token: str, table_id: str, journal: Optional[BulkJournal] = None) -> Optional[List[Dict]]:
+        """清空指定多维表格的所有记录，返回每个删除分块的结果摘要。日志中已有删除计划时直接续跑，不再读取表格。
+
+        读取现有记录失败时返回 None，不做任何修改。
+        """
         logging.info(f"准备清空表格: {table_id}")
-        record_ids = await self._get_all_record_ids(app_token, table_id)
-        
-        if not record_ids:
-            logging.info("表格已为空，无需清空。")
-            return
+        if journal is not None and journal.has("删除"):
+            record_ids = []
+        else:
+            record_ids = await self._get_all_record_ids(app_token, table_id)
+            if record_ids is None:
+                logging.error("读取现有记录失败，无法清空表格。")
+                return None
+            if not record_ids:
+                logging.info("表格已为空，无需清空。")
+                # 空的删除计划也要写入日志，否则续跑时会把已新增的记录当作旧数据删掉
+                if journal is not None: journal.plan("删除", [])
+                return []
 
-        logging.info(f"开始删除 {len(record_ids)} 条记录...")
-        for i in range(0, len(record_ids), 500):
-            chunk = record_ids[i:i+500]
-            logging.info(f"   - 正在删除第 {i+1} 到 {i+len(chunk)} 条记录...")
-            
+        results = await self.batch_delete_records(app_token, table_id, record_ids, journal)
+        logging.info("表格清空完成。")
+        return results
+
+    async def batch_delete_records(self, app_token: str, table_id: str, record_ids: List[str], journal: Optional[BulkJournal] = None) -> List[Dict]:
+        """按 500 条一批并发删除指定记录。
+
+        续跑日志时，上次可能已在飞书删除成功、但没来得及标记完成的分块会再次发送，其中的记录已不存在，
+        整批会因 RecordIdNotFound 失败：此时重新读取表格，去掉已不存在的记录后重发，全部不存在时视为完成。
+        """
+        async def send_chunk(chunk: List[str], client_token: str):
+            # 批量删除接口没有 client_token；重发已删除的记录由下面的 RecordIdNotFound 处理
+            resp = await send_delete(chunk)
+            if resp.code not in FEISHU_RECORD_NOT_FOUND_CODES: return resp
+            existing = await self._list_all_records(app_token, table_id)
+            if existing is None: return resp
+            existing_ids = {item.record_id for item in existing}
+            remaining = [record_id for record_id in chunk if record_id in existing_ids]
+            logging.info(f"   - 该批 {len(chunk)} 条记录中有 {len(chunk) - len(remaining)} 条已不存在，" + ("重发其余记录。" if remaining else "视为删除完成。"))
+            return await send_delete(remaining) if remaining else BitableResponse(0, "success")
+
+        async def send_delete(chunk: List[str]):
+            if self.async_client:
+                return await self.async_client.batch_delete(app_token, table_id, chunk)
             req_body = BatchDeleteAppTableRecordRequestBody.builder().records(chunk).build()
             req = BatchDeleteAppTableRecordRequest.builder() \
                 .app_token(app_token) \
                 .table_id(table_id) \
                 .request_body(req_body) \
                 .build()
-            
-            resp: BatchDeleteAppTableRecordResponse = await self._run_sync_in_executor(
-                self.client.bitable.v1.app_table_record.batch_delete, req
-            )
-            
-            if not resp.success():
-                logging.error(f"批量删除记录失败: {resp.code}, {resp.msg}, log_id: {resp.get_log_id()}")
-            else:
-                logging.info(f"   - 成功删除 {len(chunk)} 条记录。")
-        
-        logging.info("表格清空完成。")
+            return await self._run_sync_in_executor(self.client.bitable.v1.app_table_record.batch_delete, req)
+
+        return await self._run_chunks("删除", record_ids, send_chunk, journal)
 
+    async def batch_add_records(self, app_token: str, table_id: str, records_data: Iterable[Dict], journal: Optional[BulkJournal] = None) -> List[Dict]:
+        """新增记录，records_data 可以是列表，也可以是 iter_store_records 这样的生成器。"""
+        logging.info(f"准备向表格 {table_id} 新增记录...")
 
-    async def batch_add_records(self, app_token: str, table_id: str, records_data: List[Dict]):
-        if not records_data: logging.warning("没有数据需要添加到飞书多维表格。"); return
-        logging.info(f"准备向表格 {table_id} 新增 {len(records_data)} 条记录...")
-        for i in range(0, len(records_data), 500):
-            chunk = records_data[i:i+500]
+        async def send_chunk(chunk: List[Dict], client_token: str):
+            if self.async_client:
+                return await self.async_client.batch_create(app_token, table_id, chunk, client_token)
             request_records = [AppTableRecord.builder().fields(record).build() for record in chunk]
             req_body = BatchCreateAppTableRecordRequestBody.builder().records(request_records).build()
-            req = BatchCreateAppTableRecordRequest.builder().app_token(app_token).table_id(table_id).request_body(req_body).build()
-            resp: BatchCreateAppTableRecordResponse = await self._run_sync_in_executor(self.client.bitable.v1.app_table_record.batch_create, req)
-            if not resp.success():
-                logging.error(f"批量添加记录失败: {resp.code}, {resp.msg}, log_id: {resp.get_log_id()}")
-                lark.logger.error(f"resp: \n{json.dumps(json.loads(resp.raw.content), indent=4, ensure_ascii=False)}")
-            else: logging.info(f"   - 成功新增 {len(chunk)} 条记录。")
-        logging.info("所有记录新增完成。")
-
-# --- 3. 抖音数据下载模块 (无变化) ---
-async def download_from_douyin(cookie_file: str, url: str, download_path: str) -> bool:
-    # ... 此处代码与之前完全相同，省略以节省空间 ...
+            req = BatchCreateAppTableRecordRequest.builder().app_token(app_token).table_id(table_id) \
+                .client_token(client_token).request_body(req_body).build()
+            return await self._run_sync_in_executor(self.client.bitable.v1.app_table_record.batch_create, req)
+
+        results = await self._run_chunks("新增", records_data, send_chunk, journal)
+        if not results: logging.warning("没有数据需要添加到飞书多维表格。")
+        return results
+
+    async def reconcile_records(self, app_token: str, table_id: str, records_data: List[Dict], key_field: str,
+                                journal: Optional[BulkJournal] = None, allow_delete: bool = True) -> Optional[Dict]:
+        """按 key_field 比对表格与最新数据，只新增缺少的记录、删除多余 (含重复) 的记录。
+
+        先新增后删除，表格在同步过程中不会被清空；数据无变化时不发出任何写请求。
+        records_data 不是完整的门店列表时传入 allow_delete=False，只新增缺少的记录，不删除任何记录。
+        读取现有记录失败时返回 None，不做任何修改。日志中已有比对结果时跳过读取和比对，只续跑未完成的分块。
+        """
+        if journal is not None and journal.has("新增") and journal.has("删除"):
+            logging.info("使用批量操作日志中的比对结果续跑。")
+            existing_count = None
+        else:
+            logging.info(f"开始按 '{key_field}' 比对表格 {table_id} 的现有记录...")
+            existing = await self._list_all_records(app_token, table_id, [key_field])
+            if existing is None:
+                logging.error("读取现有记录失败，放弃本次增量同步以免误删数据。")
+                return None
+
+            record_ids_by_key: Dict[str, List[str]] = {}
+            for item in existing:
+                key = field_text((item.fields or {}).get(key_field))
+                record_ids_by_key.setdefault(key, []).append(item.record_id)
+
+            wanted_keys = {str(record[key_field]).strip() for record in records_data}
+            to_create = [record for record in records_data if str(record[key_field]).strip() not in record_ids_by_key]
+            to_delete = []
+            if allow_delete:
+                for key, record_ids in record_ids_by_key.items():
+                    # 不再存在的门店全部删除；仍存在但重复的只保留一条
+                    to_delete.extend(record_ids if key not in wanted_keys else record_ids[1:])
+            else:
+                logging.warning("最新数据不是完整的门店列表，本次只新增缺少的记录，不删除任何记录。")
+
+            existing_count = len(existing)
+            logging.info(f"比对完成: 表格现有 {len(existing)} 条，最新数据 {len(records_data)} 条；需新增 {len(to_create)} 条，需删除 {len(to_delete)} 条。")
+            if not to_create and not to_delete:
+                logging.info("数据无变化，无需写入。")
+            if journal is not None:
+                # 新增和删除一起写入计划，新增阶段中断时删除计划也不会丢失
+                journal.plan("新增", to_create)
+                journal.plan("删除", to_delete)
+        create_results = await self.batch_add_records(app_token, table_id, to_create if journal is None else [], journal)
+        delete_results = await self.batch_delete_records(app_token, table_id, to_delete if journal is None else [], journal)
+        return {
+            "existing": existing_count,
+            "created": sum(r["size"] for r in create_results if r["ok"]),
+            "deleted": sum(r["size"] for r in delete_results if r["ok"]),
+            "failed_chunks": [r for r in create_results + delete_results if not r["ok"]],
+        }
+
+# --- 3. 抖音数据下载模块 ---
+async def download_from_douyin(pool: AsyncBrowserPool, cookie_file: str, url: str, download_path: str) -> bool:
+    """在共享浏览器池的已登录页面上点击 '导出数据'，把门店 Excel 保存到 download_path。"""
     logging.info("--- 开始执行抖音数据下载任务 ---")
     if not os.path.exists(cookie_file): logging.error(f"错误: Cookie 文件 '{cookie_file}' 未找到。"); return False
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True, slow_mo=100)
-        context = await browser.new_context(accept_downloads=True)
-        try:
-            with open(cookie_file, 'r', encoding='utf-8') as f: storage_state = json.load(f)
-            await context.add_cookies(storage_state['cookies'])
-            logging.info(f"成功从 '{cookie_file}' 加载 Cookies。")
-        except Exception as e:
-            logging.error(f"加载 Cookie 文件时出错: {e}"); await browser.close(); return False
-        page = await context.new_page()
-        try:
+    try:
+        async with pool.page(cookie_file, accept_downloads=True) as page:
             logging.info(f"正在导航到目标页面: {url}")
             await page.goto(url, wait_until="domcontentloaded", timeout=60000)
             logging.info("页面DOM加载完成，开始查找元素...")
@@ -152,37 +404,193 @@ async def download_from_douyin(cookie_file: str, url: str, download_path: str) -
             logging.info(f"文件下载成功 (原始名: {download.suggested_filename})")
             logging.info(f"文件已保存至: '{download_path}'")
             return True
-        except TimeoutError as e: logging.error(f"操作超时: 等待页面元素超时。 {e}"); return False
-        except Exception as e: logging.error(f"在自动化流程中发生未知错误: {e}"); return False
-        finally: await browser.close(); logging.info("抖音下载浏览器已关闭。")
+    except TimeoutError as e: logging.error(f"操作超时: 等待页面元素超时。 {e}"); return False
+    except Exception as e: logging.error(f"在自动化流程中发生未知错误: {e}"); return False
+
+def parse_store_page(payload, list_path: str = DOUYIN_CAPTURE_LIST_PATH, name_key: str = DOUYIN_CAPTURE_NAME_KEY) -> Optional[Dict]:
+    """从门店列表接口的一页 JSON 中取出 list_path 处的门店名称，以及列表所在对象中的 total 和 has_more。
+
+    只读取已知的列表位置，响应中其他位置 (如筛选项、推荐门店) 出现的同名字段不会被当成门店。
+    payload 中没有该列表时返回 None。
+    """
+    *envelope_path, list_key = list_path.split(".")
+    envelope = payload
+    for key in envelope_path:
+        envelope = envelope.get(key) if isinstance(envelope, dict) else None
+    items = envelope.get(list_key) if isinstance(envelope, dict) else None
+    if not isinstance(items, list): return None
+    total = envelope.get("total")
+    has_more = envelope.get("has_more")
+    return {
+        "names": [item.get(name_key) for item in items if isinstance(item, dict)],
+        "total": int(total) if isinstance(total, (int, str)) and str(total).isdigit() else None,
+        "has_more": bool(has_more) if has_more is not None else None,
+    }
+
+def page_url(url: str, page_number: int, page_param: str = DOUYIN_CAPTURE_PAGE_PARAM) -> str:
+    parsed = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k != page_param]
+    return urlunparse(parsed._replace(query=urlencode(query + [(page_param, str(page_number))])))
+
+def page_number_of(url: str, page_param: str = DOUYIN_CAPTURE_PAGE_PARAM) -> int:
+    value = dict(parse_qsl(urlparse(url).query)).get(page_param, "1")
+    return int(value) if value.isdigit() else 1
+
+def repeats_seen_names(page: Dict, seen: set) -> bool:
+    """整页门店都已在前面的分页中出现过，说明接口忽略了页码参数，返回的是已经取得的分页。"""
+    return bool(page["names"]) and set(page["names"]) <= seen
+
+def collect_store_pages(pages: Dict[int, Dict]) -> tuple:
+    """按页码顺序合并连续的分页，返回 (门店名称列表, 是否完整)。
+
+    遇到缺页或重复的分页时停止；最后一页 has_more 为 False，或已取得的条数达到 total 时才算完整。
+    两者都无法判断时视为不完整，调用方不能据此删除表格中的记录。
+    """
+    names, total, has_more = [], None, None
+    for number in itertools.count(1):
+        page = pages.get(number)
+        if page is None: break
+        if repeats_seen_names(page, set(names)):
+            has_more = True
+            break
+        names.extend(page["names"])
+        total = page["total"] if page["total"] is not None else total
+        has_more = page["has_more"]
+        if not page["names"] or has_more is False: break
+    complete = (has_more is False or total is not None) and not has_more and (total is None or len(names) >= total)
+    return names, complete
+
+async def fetch_store_pages(pages: Dict[int, Dict], fetch_page, max_pages: int = DOUYIN_CAPTURE_MAX_PAGES):
+    """按页码补充请求 pages 中缺少的分页，fetch_page(页码) 返回 parse_store_page() 的结果，失败时返回 None。
+
+    已取得的条数达到 total、has_more 为 False 或取到空页时停止；页码最多到 ceil(total / 第一页条数)，
+    且不超过 max_pages。接口不认页码参数、返回的还是已取得的门店时不保存该页并停止，
+    collect_store_pages() 会因此把列表判为不完整。
+    """
+    seen = set()
+    fetched = 0
+    limit = max_pages
+    for number in range(1, max_pages + 1):
+        page = pages.get(number)
+        if page is None:
+            page = await fetch_page(number)
+            if page is None: return
+            if repeats_seen_names(page, seen):
+                logging.warning(f"补充请求的第 {number} 页与已取得的门店重复，接口可能不支持 '{DOUYIN_CAPTURE_PAGE_PARAM}' 页码参数，停止补充请求。")
+                return
+            pages[number] = page
+            logging.info(f"   - 补充请求第 {number} 页，包含 {len(page['names'])} 个门店名称。")
+        seen.update(page["names"])
+        fetched += len(page["names"])
+        total = page["total"]
+        if not page["names"] or page["has_more"] is False: return
+        if total is None and page["has_more"] is None: return
+        if total is not None:
+            if fetched >= total: return
+            if number == 1: limit = min(max_pages, math.ceil(total / len(page["names"])))
+        if number >= limit: break
+    logging.warning(f"补充请求已到第 {number} 页仍未取完门店列表，停止补充请求。")
+
+async def capture_from_douyin(pool: AsyncBrowserPool, cookie_file: str, url: str,
+                              url_pattern: str = DOUYIN_CAPTURE_URL_PATTERN) -> tuple:
+    """打开门店管理页，监听页面的网络响应，直接从门店列表接口的 JSON 中提取门店记录，不经过 Excel 文件。
+
+    页面没有自己请求完的分页 (has_more 仍为 True，或条数少于 total) 用同一登录上下文按页码补充请求。
+    返回 (门店记录, 是否完整)；url 可以指向本地模拟页面，便于离线验证。没有捕获到任何门店时门店记录为 None。
+    """
+    logging.info("--- 开始执行抖音数据截获任务 (网络响应模式) ---")
+    if not os.path.exists(cookie_file): logging.error(f"错误: Cookie 文件 '{cookie_file}' 未找到。"); return None, False
+    pattern = re.compile(url_pattern)
+    pages: Dict[int, Dict] = {}
+    list_url = None
+    matched = 0
+
+    async def on_response(response):
+        nonlocal matched, list_url
+        if not pattern.search(response.url) or response.status != 200: return
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        page = parse_store_page(payload)
+        if page is None: return
+        matched += 1
+        list_url = list_url or response.url
+        pages[page_number_of(response.url)] = page
+        logging.info(f"   - 截获接口 {response.url.split('?')[0]} 第 {page_number_of(response.url)} 页，包含 {len(page['names'])} 个门店名称。")
+
+    async def fetch_page(page, number):
+        resp = await page.request.get(page_url(list_url, number))
+        if not resp.ok:
+            logging.warning(f"补充请求门店列表第 {number} 页失败 (HTTP {resp.status})。"); return None
+        try:
+            return parse_store_page(await resp.json())
+        except Exception:
+            return None
+
+    try:
+        # 与下载模式使用相同的上下文参数，退回下载时可直接复用已登录的上下文
+        async with pool.page(cookie_file, accept_downloads=True) as page:
+            page.on("response", on_response)
+            try:
+                logging.info(f"正在导航到目标页面: {url}")
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                try:
+                    await page.wait_for_load_state("networkidle", timeout=DOUYIN_CAPTURE_TIMEOUT * 1000)
+                except TimeoutError:
+                    logging.warning(f"等待页面网络空闲超时 ({DOUYIN_CAPTURE_TIMEOUT} 秒)，使用已截获的数据。")
+            finally:
+                # 页面会放回池中复用，监听器必须移除
+                page.remove_listener("response", on_response)
+            if list_url: await fetch_store_pages(pages, functools.partial(fetch_page, page))
+    except Exception as e:
+        logging.error(f"截获门店数据时发生错误: {e}"); return None, False
+
+    names, complete = collect_store_pages(pages)
+    records = list(clean_store_records(names))
+    total = next((p["total"] for p in pages.values() if p["total"] is not None), None)
+    logging.info(f"共截获 {matched} 个接口响应，取得 {len(names)} 个门店 (接口总数 {total if total is not None else '未知'})，"
+                 f"{len(records)} 条不重复的门店记录{'' if complete else '，列表不完整'}。")
+    return records or None, complete
 
 # --- 4. 数据处理模块 (无变化) ---
+def clean_store_records(values: Iterable, column: str = STORE_NAME_FIELD) -> Iterator[Dict]:
+    """去空白、去重，逐条产出 {column: 门店名称}。"""
+    seen = set()
+    for value in values:
+        if value is None: continue
+        name = str(value).strip()
+        if name and name not in seen:
+            seen.add(name)
+            yield {column: name}
+
+def iter_store_records(filepath: str, column: str = STORE_NAME_FIELD) -> Iterator[Dict]:
+    """以只读模式流式读取 Excel 的第一个工作表，只解析目标列，去空白、去重后逐条产出 {column: 值}。
+
+    第一行为表头；找不到目标列时抛出 ValueError。
+    """
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), None) or ()
+        header = [str(h).strip() if h is not None else "" for h in header]
+        if column not in header:
+            raise ValueError(f"未找到目标列 '{column}'，表头: {header}")
+        col = header.index(column) + 1
+        yield from clean_store_records((value for (value,) in sheet.iter_rows(min_row=2, min_col=col, max_col=col, values_only=True)), column)
+    finally:
+        workbook.close()
+
 def process_downloaded_data(filepath: str) -> List[Dict]:
-    # ... 此处代码与之前完全相同，省略以节省空间 ...
-    TARGET_COLUMN = "门店名称"
+    TARGET_COLUMN = STORE_NAME_FIELD
     logging.info(f"正在处理下载的Excel文件，目标列: '{TARGET_COLUMN}'")
     
     if not os.path.exists(filepath):
         logging.error(f"文件处理失败：文件未找到于 '{filepath}'")
         return []
 
-    records_to_add = []
     try:
-        df = pd.read_excel(filepath)
-        logging.info(f"成功使用pandas加载Excel文件，共 {len(df)} 行，列名: {list(df.columns)}")
-
-        if TARGET_COLUMN not in df.columns:
-            logging.error(f"错误: 下载的Excel文件中未找到目标列 '{TARGET_COLUMN}'。请检查下载的文件内容。")
-            return []
-        
-        store_names = df[TARGET_COLUMN].dropna().unique()
-        
-        for name in store_names:
-            clean_name = str(name).strip()
-            if clean_name:
-                record = {TARGET_COLUMN: clean_name}
-                records_to_add.append(record)
-
+        records_to_add = list(iter_store_records(filepath, TARGET_COLUMN))
         logging.info(f"数据处理完成，共准备了 {len(records_to_add)} 条不重复的 '{TARGET_COLUMN}' 记录。")
         
         if records_to_add:
@@ -192,26 +600,123 @@ def process_downloaded_data(filepath: str) -> List[Dict]:
         return records_to_add
 
     except Exception as e:
-        logging.error(f"使用 pandas 处理Excel文件时发生错误: {e}")
+        logging.error(f"处理Excel文件时发生错误: {e}")
         return []
 
-# --- 5. 主流程 (无变化) ---
+def store_fingerprint(records: Iterable[Dict], column: str = STORE_NAME_FIELD) -> str:
+    """对去重、排序后的门店名称列表计算 sha256，结果与导出文件的行顺序无关。"""
+    names = sorted({str(record[column]).strip() for record in records})
+    return hashlib.sha256("\n".join(names).encode("utf-8")).hexdigest()
+
+def load_last_fingerprint(path: str = STORE_FINGERPRINT_FILE) -> Optional[Dict]:
+    if not os.path.exists(path): return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except Exception as e:
+        logging.warning(f"读取同步指纹文件失败，将重新同步: {e}")
+        return None
+
+def save_fingerprint(fingerprint: str, count: int, path: str = STORE_FINGERPRINT_FILE):
+    state = {"fingerprint": fingerprint, "count": count, "app_token": FEISHU_APP_TOKEN, "table_id": FEISHU_TABLE_ID,
+             "synced_at": datetime.datetime.now().isoformat(timespec="seconds")}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    logging.info(f"已记录本次同步指纹 {fingerprint[:12]}… ({count} 条门店)。")
+
+def mark_fingerprint_dirty(path: str = STORE_FINGERPRINT_FILE):
+    """开始写入飞书前把上次的同步指纹标记为失效。
+
+    本次同步中途失败时表格已经不再对应上次的门店列表，门店列表之后变回原样也不能因指纹一致而跳过同步；
+    本次全部成功后 save_fingerprint() 会覆盖这个标记。
+    """
+    state = load_last_fingerprint(path)
+    if not state or state.get("dirty"): return
+    state["dirty"] = True
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def is_unchanged(fingerprint: str, last: Optional[Dict]) -> bool:
+    return bool(last) and not last.get("dirty") and last.get("fingerprint") == fingerprint \
+        and last.get("app_token") == FEISHU_APP_TOKEN and last.get("table_id") == FEISHU_TABLE_ID
+
+async def sync_to_feishu(feishu_manager: FeishuBitableManager, records_to_add: List[Dict], upsert_only: bool = False) -> bool:
+    """把门店列表同步到飞书表格，门店列表与上次成功同步时一致则跳过。全部成功 (或跳过) 时返回 True。
+
+    upsert_only 表示 records_to_add 不是完整的门店列表：只新增缺少的门店，不删除记录，也不记录同步指纹。
+    """
+    fingerprint = store_fingerprint(records_to_add)
+    last = load_last_fingerprint(STORE_FINGERPRINT_FILE)
+    if is_unchanged(fingerprint, last) and not FEISHU_FORCE_SYNC and not upsert_only:
+        logging.info(f"门店列表与上次成功同步 ({last.get('synced_at')}) 时一致 (指纹 {fingerprint[:12]}…)，跳过飞书同步。如需强制同步请设置 FEISHU_FORCE_SYNC=true。")
+        return True
+    if last and last.get("dirty"):
+        logging.info("上次飞书同步没有全部完成，表格可能只改了一部分，本次重新比对。")
+
+    logging.info("\n--- 开始执行飞书数据同步任务 ---")
+
+    sync_mode = "upsert" if upsert_only else FEISHU_SYNC_MODE
+    journal = BulkJournal(FEISHU_JOURNAL_FILE, f"{sync_mode}:{FEISHU_APP_TOKEN}:{FEISHU_TABLE_ID}:{fingerprint}")
+    mark_fingerprint_dirty(STORE_FINGERPRINT_FILE)
+    if sync_mode == "replace":
+        results = await feishu_manager.clear_table(FEISHU_APP_TOKEN, FEISHU_TABLE_ID, journal)
+        # 没能读取表格时不再新增，否则旧记录仍在、又写入一份完整列表，还会记录同步指纹
+        if results is None: logging.error("飞书全量同步失败，任务终止。"); return False
+        results += await feishu_manager.batch_add_records(FEISHU_APP_TOKEN, FEISHU_TABLE_ID, records_to_add, journal)
+        failed_chunks = [r for r in results if not r["ok"]]
+    else:
+        summary = await feishu_manager.reconcile_records(FEISHU_APP_TOKEN, FEISHU_TABLE_ID, records_to_add, STORE_NAME_FIELD, journal,
+                                                         allow_delete=not upsert_only)
+        if summary is None: logging.error("飞书增量同步失败，任务终止。"); return False
+        logging.info(f"增量同步结果: 新增 {summary['created']} 条，删除 {summary['deleted']} 条，失败分块 {len(summary['failed_chunks'])} 个。")
+        failed_chunks = summary["failed_chunks"]
+    # 只有全部分块成功才记录指纹并删除日志，否则下次运行从未完成的分块继续
+    if failed_chunks:
+        logging.warning(f"有 {len(failed_chunks)} 个分块失败，不记录同步指纹；下次运行将从批量操作日志 '{FEISHU_JOURNAL_FILE}' 续跑。")
+        return False
+    journal.complete()
+    # 不完整的门店列表同步后表格仍可能有多余的门店，不能让下次运行因指纹一致而跳过
+    if not upsert_only: save_fingerprint(fingerprint, len(records_to_add), STORE_FINGERPRINT_FILE)
+    return True
+
+# --- 5. 主流程 ---
 async def main():
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     download_filepath = os.path.join(DOWNLOAD_DIR, DOWNLOADED_FILENAME)
     
-    success = await download_from_douyin(DOUYIN_COOKIE_FILE, DOUYIN_TARGET_URL, download_filepath)
-    if not success: logging.error("抖音数据下载失败，任务终止。"); return
-        
-    records_to_add = process_downloaded_data(download_filepath)
+    records_to_add = None
+    # 截获到的门店列表不完整时先改用导出下载；下载也失败时用它只新增门店，不删除记录，也不记录同步指纹
+    partial_records = None
+    downloaded = False
+    # 截获失败退回下载模式时复用同一个浏览器和已登录的上下文
+    async with AsyncBrowserPool() as pool:
+        if DOUYIN_ACQUIRE_MODE == "capture":
+            records_to_add, complete = await capture_from_douyin(pool, DOUYIN_COOKIE_FILE, DOUYIN_TARGET_URL)
+            if records_to_add and not complete:
+                logging.warning("截获的门店列表不完整，改用导出下载模式。")
+                partial_records, records_to_add = records_to_add, None
+            elif not records_to_add: logging.warning("未能通过网络响应截获门店数据，改用导出下载模式。")
+
+        if not records_to_add:
+            downloaded = await download_from_douyin(pool, DOUYIN_COOKIE_FILE, DOUYIN_TARGET_URL, download_filepath)
+            if not downloaded and not partial_records:
+                logging.error("抖音数据下载失败，任务终止。"); logging.info(pool.profile.summary()); return
+        logging.info(pool.profile.summary())
+    logging.info("抖音浏览器已关闭。")
+    if downloaded:
+        records_to_add = process_downloaded_data(download_filepath)
+    upsert_only = not records_to_add and bool(partial_records)
+    if upsert_only:
+        logging.warning(f"导出下载未得到数据，使用不完整的截获结果 ({len(partial_records)} 条) 只新增缺少的门店。")
+        records_to_add = partial_records
     if not records_to_add: logging.error("数据处理失败或无有效数据，任务终止。"); return
-        
-    logging.info("\n--- 开始执行飞书数据同步任务 ---")
+
     feishu_manager = FeishuBitableManager(FEISHU_APP_ID, FEISHU_APP_SECRET)
-    
-    await feishu_manager.clear_table(FEISHU_APP_TOKEN, FEISHU_TABLE_ID)
-    
-    await feishu_manager.batch_add_records(FEISHU_APP_TOKEN, FEISHU_TABLE_ID, records_to_add)
+    try:
+        await sync_to_feishu(feishu_manager, records_to_add, upsert_only)
+    finally:
+        await feishu_manager.close()
     
     logging.info("\n--- 所有任务执行完毕 ---")
 
@@ -6,6 +6,8 @@ import time
 from datetime import datetime
 from openai import OpenAI
 
+from feishu_bitable import BitableClient
+
 # ==========================================
 # 1. 环境变量与配置信息加载
 # ==========================================
@@ -27,13 +29,7 @@ CUSTOM_LLM_MODEL_ID = "gemini-3.1-flash-lite"
 CUSTOM_LLM_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai"
 
 # ==========================================
-# 2. API 端点定义
-# ==========================================
-TENANT_ACCESS_TOKEN_URL = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal/"
-SEARCH_RECORDS_URL = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{APP_TOKEN}/tables/{TABLE_ID}/records/search"
-
-# ==========================================
-# 3. 核心功能函数
+# 2. 核心功能函数
 # ==========================================
 def check_env_vars():
     required_vars = [
@@ -46,23 +42,6 @@ def check_env_vars():
         return False
     return True
 
-def get_tenant_access_token(app_id, app_secret):
-    payload = {"app_id": app_id, "app_secret": app_secret}
-    headers = {'Content-Type': 'application/json'}
-    print("正在获取飞书 access_token...")
-    try:
-        response = requests.post(TENANT_ACCESS_TOKEN_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        result = response.json()
-        if result.get("code") == 0:
-            return result.get("tenant_access_token")
-        else:
-            print(f"获取 access_token 失败: {result.get('msg')}")
-            return None
-    except Exception as e:
-        print(f"网络请求失败: {e}")
-        return None
-
 def parse_rich_text(field_value):
     if not isinstance(field_value, list):
         return str(field_value)
@@ -72,45 +51,28 @@ def parse_rich_text(field_value):
             text_parts.append(item.get("text", ""))
     return "".join(text_parts)
 
-def get_daily_info_with_links(access_token):
-    headers = {'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'}
+def get_daily_info_with_links(client):
     info_data = []
-    page_token = ""
     print("\n开始查询飞书最近1天的内部信息内容...")
-    while True:
-        payload = {
-            "filter": {
+    try:
+        records = client.iter_records(
+            APP_TOKEN, TABLE_ID,
+            field_names=["完整信息内容", "视频链接", "发布日期"],
+            filter={
                 "conjunction": "and", 
                 "conditions": [{"field_name": "发布日期", "operator": "is", "value": ["Yesterday"]}] 
             },
-            "field_names": ["完整信息内容", "视频链接", "发布日期"],
-            "page_size": 100,
-            "page_token": page_token
-        }
-        try:
-            response = requests.post(SEARCH_RECORDS_URL, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("code") != 0:
-                break
-            data = result.get("data", {})
-            items = data.get("items", [])
-            if not items and not page_token:
-                break
-            for item in items:
-                fields = item.get('fields', {})
-                info_raw = fields.get('完整信息内容')
-                link = fields.get('视频链接')
-                if info_raw:
-                    info_text = parse_rich_text(info_raw).strip()
-                    info_data.append({"content": info_text, "link": link})
-            if data.get('has_more'):
-                page_token = data.get('page_token')
-            else:
-                break
-        except Exception as e:
-            print(f"查询记录时网络请求失败: {e}")
-            break
+            page_size=100,
+        )
+        for item in records:
+            fields = item.fields
+            info_raw = fields.get('完整信息内容')
+            link = fields.get('视频链接')
+            if info_raw:
+                info_text = parse_rich_text(info_raw).strip()
+                info_data.append({"content": info_text, "link": link})
+    except Exception as e:
+        print(f"查询飞书记录失败: {e}")
     print(f"飞书查询完成，共找到 {len(info_data)} 条内部观点。")
     return info_data
 
@@ -426,8 +388,9 @@ def main():
     if not check_env_vars():
         return
 
-    token = get_tenant_access_token(APP_ID, APP_SECRET)
-    info_entries = get_daily_info_with_links(token) if token else []
+    with BitableClient(APP_ID, APP_SECRET) as client:
+        info_entries = get_daily_info_with_links(client)
+        print(client.stats.summary())
 
     news_entries = get_industry_news()
 